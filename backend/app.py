@@ -713,55 +713,235 @@
 #     app.run(host='0.0.0.0', port=os.environ.get('PORT', 10000))
 
 import os
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template
 from flask_cors import CORS
 from dotenv import load_dotenv
+
+# Load environment variables from .env file (for local development). This runs before the local
+# modules below are imported, because they read their settings from the environment at import time.
+load_dotenv()
+
 import requests
-import joblib
-import pandas as pd
+import hashlib
+import math
+import numpy as np
 import sqlite3
-from datetime import datetime
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from werkzeug.http import is_resource_modified
+
+import db
+import metrics
+from cache import normalize_city
+from compression import init_compression
+from features import FeatureEncoder
+from forecast import summarize_forecast
+from history import parse_time, query_history
+from json_provider import configure_json
+from linear_model import LinearModel, is_exported_from
+from logging_setup import get_logger
+from migrations import migrate
+from profiling import init_profiling
+from observation_writer import create_writer_from_env
+from upstream import fetch_current_and_forecast, fetch_current_many, cache_stats, current_weather_info, weather_validators
 
 # Flask app initialization
 app = Flask(__name__,
             template_folder=os.path.join(os.path.dirname(__file__), 'templates'),
             static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 CORS(app)
+# orjson-backed jsonify when available, and gzip/brotli for large responses
+configure_json(app)
+init_compression(app)
+# Request timings for /metrics
+metrics.init_metrics(app)
+# Opt-in per-request and continuous profiling (PROFILING=1 / PROFILING_CONTINUOUS=1)
+init_profiling(app)
+
+# JSON logs written from a background thread, see logging_setup.py
+log = get_logger('app')
 
 # Database Configuration
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DATABASE_NAME = os.path.join(BASE_DIR, 'weather_data.db')
+DATABASE_NAME = db.DATABASE_NAME
+
+# Schema migrations are applied once at startup instead of creating the table on every /weather request
+try:
+    migrate()
+except sqlite3.Error as e:
+    log.error("Could not migrate database schema in %s. SQLite Error: %s", DATABASE_NAME, e)
+
+# Background writer for /weather observations (ASYNC_DB_WRITES=0 writes inline instead)
+OBSERVATION_WRITER = create_writer_from_env()
+
+def collect_writer_metrics():
+    if OBSERVATION_WRITER is None:
+        return
+    stats = OBSERVATION_WRITER.stats()
+    yield 'counter', 'weather_observations_written_total', {}, stats["written"]
+    yield 'counter', 'weather_observations_dropped_total', {}, stats["dropped"]
+    yield 'gauge', 'weather_observation_queue_depth', {}, stats["queued"]
+
+metrics.register_collector(collect_writer_metrics)
 
-# Load environment variables from .env file (for local development)
-load_dotenv()
 OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY')
 
 if not OPENWEATHER_API_KEY:
-    print("WARNING: OPENWEATHER_API_KEY environment variable not found. Weather API calls will likely fail.")
-
-BASE_URL = "http://api.openweathermap.org/data/2.5/"
+    log.warning("OPENWEATHER_API_KEY environment variable not found. Weather API calls will likely fail.")
 
 # Load the trained ML model
 MODEL_PATH = os.path.join(BASE_DIR, 'linear_regression_model.joblib')
+# Coefficients exported by export_model.py; predicting from these only needs NumPy
+LINEAR_MODEL_PATH = os.path.join(BASE_DIR, 'linear_model.json')
+
+# MODEL_BACKEND: 'linear' uses linear_model.json, 'sklearn' uses the joblib file,
+# 'auto' (default) uses linear_model.json when it exists and was exported from the current joblib
+# file, and falls back to joblib otherwise.
+MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'auto')
+
+def predictive_model_path():
+    use_linear = MODEL_BACKEND == 'linear' or (MODEL_BACKEND == 'auto' and os.path.exists(LINEAR_MODEL_PATH))
+    if not use_linear or not os.path.exists(MODEL_PATH) or is_exported_from(LINEAR_MODEL_PATH, MODEL_PATH):
+        return LINEAR_MODEL_PATH if use_linear else MODEL_PATH
+    # The joblib was retrained (or replaced) without re-running export_model.py
+    if MODEL_BACKEND == 'linear':
+        log.warning("%s was not exported from the current %s. Predictions may differ from the trained model; run export_model.py.",
+                    LINEAR_MODEL_PATH, MODEL_PATH)
+        return LINEAR_MODEL_PATH
+    log.warning("%s was not exported from the current %s, using the joblib model instead. Run export_model.py to update it.",
+                LINEAR_MODEL_PATH, MODEL_PATH)
+    return MODEL_PATH
+
+def load_predictive_model(path):
+    if path == LINEAR_MODEL_PATH:
+        return LinearModel.load(LINEAR_MODEL_PATH)
+    # joblib (and with it scikit-learn/scipy) is only imported when the pickled model is needed
+    import joblib
+    return joblib.load(MODEL_PATH)
+
+# MODEL_LOAD_MODE: 'eager' (default) loads the model while the app is imported. Run gunicorn with
+# preload_app (see gunicorn.conf.py) so this happens once in the master and forked workers share
+# the loaded model copy-on-write. 'lazy' defers loading to the first prediction request, so
+# '/' and '/weather' can serve before the model is ready.
+MODEL_LOAD_MODE = os.getenv('MODEL_LOAD_MODE', 'eager')
 
 PREDICTIVE_MODEL = None # Global variable to store the loaded model
-
-try:
-    PREDICTIVE_MODEL = joblib.load(MODEL_PATH)
-    print("Machine Learning Model loaded successfully!")
-except FileNotFoundError:
-    print(f"Error: Model file not found at {MODEL_PATH}. Please ensure it is saved and committed to Git.")
-except Exception as e:
-    print(f"Error loading the ML model: {e}")
+MODEL_LOAD_SECONDS = None
+# Hash of the model file, part of the /predict_temperature ETag so a new model invalidates cached predictions
+MODEL_FINGERPRINT = None
+_model_lock = threading.Lock()
+_model_load_attempted = False
 
 # IMPORTANT: Ye list aapke Jupyter Notebook se 'X.columns.tolist()' ka exact output hai.
 # Is list mein aapne 'city_', 'country_', 'description_', aur 'icon_' features include kiye hain.
 MODEL_FEATURES = ['humidity', 'pressure', 'wind_speed', 'hour_of_day', 'day_of_week', 'month', 'city_Dubai', 'city_Moscow', 'city_Mumbai', 'city_New York', 'city_Paris', 'city_Sydney', 'city_Tokyo', 'city_Toronto', 'country_AU', 'country_CA', 'country_FR', 'country_IN', 'country_JP', 'country_RU', 'country_TH', 'country_US', 'description_clear sky', 'description_few clouds', 'description_light rain', 'description_mist', 'description_overcast clouds', 'icon_02n', 'icon_04d', 'icon_04n', 'icon_10n', 'icon_50n']
 
+# Column positions for MODEL_FEATURES are resolved once here instead of on every prediction
+FEATURE_ENCODER = FeatureEncoder(MODEL_FEATURES)
+
+# The model was fitted on a DataFrame, so scikit-learn warns on every NumPy input about missing
+# feature names. The encoder guarantees the MODEL_FEATURES column order, so that warning is noise.
+warnings.filterwarnings('ignore', message='X does not have valid feature names', category=UserWarning)
+
+def get_predictive_model():
+    global PREDICTIVE_MODEL, MODEL_LOAD_SECONDS, MODEL_FINGERPRINT, _model_load_attempted
+    if _model_load_attempted:
+        return PREDICTIVE_MODEL
+    with _model_lock:
+        if _model_load_attempted:
+            return PREDICTIVE_MODEL
+        started = time.perf_counter()
+        try:
+            path = predictive_model_path()
+            model = load_predictive_model(path)
+            if hasattr(model, 'feature_names_in_') and list(model.feature_names_in_) != MODEL_FEATURES:
+                log.warning("MODEL_FEATURES does not match the feature order the model was trained with. Predictions will be wrong.")
+            with open(path, 'rb') as f:
+                MODEL_FINGERPRINT = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+            PREDICTIVE_MODEL = model
+            MODEL_LOAD_SECONDS = time.perf_counter() - started
+            log.info("Machine Learning Model loaded successfully", extra={
+                "model": type(model).__name__, "load_mode": MODEL_LOAD_MODE, "load_seconds": round(MODEL_LOAD_SECONDS, 3)
+            })
+        except FileNotFoundError:
+            log.error("Model file not found at %s or %s. Please ensure it is saved and committed to Git.", MODEL_PATH, LINEAR_MODEL_PATH)
+        except Exception:
+            log.exception("Error loading the ML model")
+        finally:
+            _model_load_attempted = True
+    return PREDICTIVE_MODEL
+
+if MODEL_LOAD_MODE != 'lazy':
+    get_predictive_model()
+
+UNKNOWN_FEATURE_LABELS = {
+    'city': 'City',
+    'country': 'Country code',
+    'description': 'Description',
+    'icon': 'Icon'
+}
+# One message template per kind: log rate limiting is keyed on the template, so a flood of unknown
+# cities must not hold back the warnings about unknown icons
+UNKNOWN_FEATURE_MESSAGES = {
+    prefix: f"{label} '%s' is not a recognized feature. Its one-hot encoding will be 0."
+    for prefix, label in UNKNOWN_FEATURE_LABELS.items()
+}
+UNKNOWN_BATCH_FEATURE_MESSAGES = {
+    prefix: f"{label} '%s' is not a recognized feature in %d batch rows. Its one-hot encoding will be 0."
+    for prefix, label in UNKNOWN_FEATURE_LABELS.items()
+}
+
+PREDICT_BATCH_MAX_ROWS = int(os.getenv('PREDICT_BATCH_MAX_ROWS', '10000'))
+PREDICTION_NUMERIC_FIELDS = ('humidity', 'pressure', 'wind_speed')
+PREDICTION_TEXT_FIELDS = ('city', 'description', 'icon', 'country_code')
+
+MULTI_CITY_MAX = int(os.getenv('MULTI_CITY_MAX', '50'))
+# Used by /weather/multi?include_forecast=1 to run the per-city /weather lookups side by side.
+# Kept separate from the upstream pool because each of these lookups submits work to that pool.
+_multi_city_executor = ThreadPoolExecutor(max_workers=int(os.getenv('MULTI_CITY_WORKERS', '8')), thread_name_prefix='multi-city')
+
+HISTORY_DEFAULT_LIMIT = 100
+HISTORY_MAX_LIMIT = int(os.getenv('HISTORY_MAX_LIMIT', '1000'))
+
 @app.route('/')
 def home():
     return render_template('index.html')
 
+def client_has_current(etag, last_modified=None):
+    # Conditional GET: True when the request's If-None-Match (or If-Modified-Since) still matches
+    if last_modified is not None:
+        last_modified = datetime.fromtimestamp(int(last_modified), timezone.utc)
+    return not is_resource_modified(request.environ, etag=etag, last_modified=last_modified)
+
+def with_cache_headers(response, etag, max_age, last_modified=None):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = datetime.fromtimestamp(int(last_modified), timezone.utc)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response
+
+def save_observation(city, weather_info):
+    current_timestamp, collected_at = db.observation_time()
+    observation = db.observation_row(weather_info, current_timestamp, collected_at)
+    if OBSERVATION_WRITER is not None:
+        # One line per /weather miss, so only at DEBUG; weather_observations_*_total has the counts
+        if OBSERVATION_WRITER.submit(observation):
+            log.debug("Observation queued for database", extra={"city": city, "observed_at": current_timestamp})
+        else:
+            log.warning("Observation queue full, observation dropped", extra={"city": city, "observed_at": current_timestamp})
+        return
+    try:
+        conn = db.get_connection()
+        with metrics.timed('db_write'), conn:
+            conn.execute(db.INSERT_OBSERVATION, observation)
+        log.debug("Observation saved to database", extra={"city": city, "observed_at": current_timestamp})
+    except sqlite3.Error as e:
+        log.error("Could not save observation to database. SQLite Error: %s", e, extra={"city": city, "observed_at": current_timestamp})
+
 @app.route('/weather')
 def get_weather():
     city = request.args.get('city')
@@ -775,98 +955,33 @@ def get_weather():
     }
 
     try:
-        current_weather_url = f"{BASE_URL}weather"
-        response = requests.get(current_weather_url, params=params)
-        response.raise_for_status()
-        current_data = response.json()
-
-        forecast_url = f"{BASE_URL}forecast"
-        forecast_response = requests.get(forecast_url, params=params)
-        forecast_response.raise_for_status()
-        forecast_data = forecast_response.json()
-
-        weather_info = {
-            "city": current_data["name"],
-            "country": current_data["sys"]["country"],
-            "temperature": current_data["main"]["temp"],
-            "feels_like": current_data["main"]["feels_like"],
-            "humidity": current_data["main"]["humidity"],
-            "description": current_data["weather"][0]["description"],
-            "icon": current_data["weather"][0]["icon"],
-            "wind_speed": current_data["wind"]["speed"],
-            "pressure": current_data["main"]["pressure"]
-        }
-
-        conn = None
-        try:
-            conn = sqlite3.connect(DATABASE_NAME)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS current_weather (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    city TEXT NOT NULL,
-                    country TEXT,
-                    description TEXT,
-                    feels_like REAL,
-                    humidity INTEGER,
-                    icon TEXT,
-                    pressure INTEGER,
-                    temperature REAL,
-                    wind_speed REAL,
-                    collection_timestamp TEXT
-                )
-            ''')
-            conn.commit()
-
-            current_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-            cursor.execute('''
-                INSERT INTO current_weather (
-                    city, country, description, feels_like, humidity,
-                    icon, pressure, temperature, wind_speed, collection_timestamp
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                weather_info['city'], weather_info['country'], weather_info['description'],
-                weather_info['feels_like'], weather_info['humidity'], weather_info['icon'],
-                weather_info['pressure'], weather_info['temperature'], weather_info['wind_speed'],
-                current_timestamp
-            ))
-            conn.commit()
-            print(f"Data for {city} saved to database at {current_timestamp}")
-        except sqlite3.Error as e:
-            print(f"ERROR: Could not save data for {city} to database. SQLite Error: {e}")
-            print(f"SQL Query attempt failed.")
-        finally:
-            if conn:
-                conn.close()
-
-        daily_forecasts = {}
-        for item in forecast_data["list"]:
-            date = item["dt_txt"].split(" ")[0]
-            if date not in daily_forecasts:
-                daily_forecasts[date] = {
-                    "temp_max": item["main"]["temp_max"],
-                    "temp_min": item["main"]["temp_min"],
-                    "description": item["weather"][0]["description"],
-                    "icon": item["weather"][0]["icon"]
-                }
-            else:
-                daily_forecasts[date]["temp_max"] = max(daily_forecasts[date]["temp_max"], item["main"]["temp_max"])
-                daily_forecasts[date]["temp_min"] = min(daily_forecasts[date]["temp_min"], item["main"]["temp_min"])
-
-        forecast_list = [{"date": date, **data} for date, data in daily_forecasts.items()]
-
-        return jsonify({
-            "current_weather": weather_info,
-            "forecast": forecast_list
-        })
+        current_data, forecast_data, fresh = fetch_current_and_forecast(params)
+
+        weather_info = current_weather_info(current_data)
+
+        # Only the request that actually fetched from upstream stores an observation; cached and
+        # coalesced responses would just insert the same reading again
+        if fresh:
+            save_observation(city, weather_info)
+
+        # Validators come from the cached upstream payloads, so repeat lookups within the cache TTL
+        # get a 304 and browsers/the CDN can reuse the response until the cache entry expires
+        etag, last_modified, max_age = weather_validators(city, current_data, forecast_data)
+        if client_has_current(etag, last_modified):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify({
+                "current_weather": weather_info,
+                "forecast": summarize_forecast(forecast_data)
+            })
+        return with_cache_headers(response, etag, max_age, last_modified)
 
     except requests.exceptions.HTTPError as http_err:
+        status_code = http_err.response.status_code
         error_msg = f"HTTP error occurred: {http_err}"
-        if response.status_code == 401:
+        if status_code == 401:
             error_msg += ". Check your OpenWeatherMap API Key."
-        return jsonify({"error": error_msg}), response.status_code
+        return jsonify({"error": error_msg}), status_code
     except requests.exceptions.ConnectionError as conn_err:
         return jsonify({"error": f"Connection error occurred: {conn_err}"}), 503
     except requests.exceptions.Timeout as timeout_err:
@@ -878,10 +993,130 @@ def get_weather():
     except Exception as e:
         return jsonify({"error": f"An unexpected server error occurred: {e}"}), 500
 
+# ----- Multi-City Weather Route -----
+def describe_upstream_error(error):
+    # Same messages and status codes as /weather, for one city of a multi-city lookup
+    if isinstance(error, requests.exceptions.HTTPError):
+        status_code = error.response.status_code
+        error_msg = f"HTTP error occurred: {error}"
+        if status_code == 401:
+            error_msg += ". Check your OpenWeatherMap API Key."
+        return error_msg, status_code
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return f"Connection error occurred: {error}", 503
+    if isinstance(error, requests.exceptions.Timeout):
+        return f"Timeout error occurred: {error}", 504
+    if isinstance(error, requests.exceptions.RequestException):
+        return f"An error occurred during API request: {error}", 500
+    if isinstance(error, KeyError):
+        return f"Invalid data received from API or missing key: {error}. Check city name and API response structure.", 500
+    return f"An unexpected server error occurred: {error}", 500
+
+def fetch_city_with_forecast(city, params):
+    try:
+        return fetch_current_and_forecast(dict(params, q=city))
+    except Exception as e:
+        return e
+
+def city_weather_result(city, outcome):
+    # One entry of the /weather/multi response. `outcome` is (current_data, forecast_data, fresh)
+    # or the exception raised for this city; errors are reported per city instead of failing the request.
+    try:
+        if isinstance(outcome, Exception):
+            raise outcome
+        current_data, forecast_data, fresh = outcome
+        result = {"city": city, "current_weather": current_weather_info(current_data)}
+        if forecast_data is not None:
+            result["forecast"] = summarize_forecast(forecast_data)
+    except Exception as e:
+        error_msg, status_code = describe_upstream_error(e)
+        return {"city": city, "error": error_msg, "status": status_code}
+    if fresh:
+        save_observation(city, result["current_weather"])
+    return result
+
+@app.route('/weather/multi')
+def get_weather_multi():
+    cities = []
+    for value in request.args.getlist('cities') + request.args.getlist('city'):
+        cities.extend(city.strip() for city in value.split(',') if city.strip())
+    if not cities:
+        return jsonify({"error": "cities parameter is required, e.g. ?cities=Mumbai,Tokyo,Paris"}), 400
+    if len(cities) > MULTI_CITY_MAX:
+        return jsonify({"error": f"Too many cities: {len(cities)}. Maximum per request is {MULTI_CITY_MAX}."}), 400
+
+    include_forecast = request.args.get('include_forecast', '').lower() in ('1', 'true', 'yes')
+    params = {
+        "appid": OPENWEATHER_API_KEY,
+        "units": "metric"
+    }
+    if include_forecast:
+        # Full /weather lookup per city (cache and single-flight aware), all cities at once
+        outcomes = list(_multi_city_executor.map(lambda city: fetch_city_with_forecast(city, params), cities))
+    else:
+        # Current conditions only: cached cities are free, the rest come from 'group' calls by city ID
+        # plus concurrent single-city calls for IDs not seen yet
+        fetched = fetch_current_many(cities, params)
+        outcomes = []
+        for city in cities:
+            outcome = fetched[normalize_city(city)]
+            outcomes.append(outcome if isinstance(outcome, Exception) else (outcome[0], None, outcome[1]))
+    results = [city_weather_result(city, outcome) for city, outcome in zip(cities, outcomes)]
+
+    return jsonify({
+        "count": len(results),
+        "errors": sum(1 for result in results if "error" in result),
+        "results": results
+    })
+
+# ----- History Route -----
+@app.route('/history')
+def get_history():
+    city = request.args.get('city', '').strip()
+    if not city:
+        return jsonify({"error": "City parameter is required"}), 400
+
+    resolution = request.args.get('resolution', 'raw')
+    cursor = request.args.get('cursor')
+    try:
+        start = parse_time(request.args['start']) if request.args.get('start') else 0
+        end = parse_time(request.args['end']) if request.args.get('end') else int(time.time()) + 1
+        # Not get(type=int): that silently falls back to the default for a value like 'abc'
+        limit = request.args.get('limit', str(HISTORY_DEFAULT_LIMIT)).strip()
+        if not limit.isdigit() or not 1 <= int(limit) <= HISTORY_MAX_LIMIT:
+            raise ValueError(f"limit must be an integer between 1 and {HISTORY_MAX_LIMIT}")
+        limit = int(limit)
+        observations, next_cursor = query_history(city, start, end, resolution, limit, cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except sqlite3.Error as e:
+        return jsonify({"error": f"Could not read history from database. SQLite Error: {e}"}), 500
+
+    return jsonify({
+        "city": city,
+        "resolution": resolution,
+        "start": start,
+        "end": end,
+        "observations": observations,
+        "next_cursor": next_cursor
+    })
+
+# ----- Upstream Cache Stats Route -----
+@app.route('/cache_stats')
+def get_cache_stats():
+    return jsonify(cache_stats())
+
+# ----- Metrics Route -----
+@app.route('/metrics')
+def get_metrics():
+    # Prometheus text format, summed over all gunicorn workers (see metrics.py)
+    return Response(metrics.render_server(), mimetype='text/plain; version=0.0.4')
+
 # ----- Predict Temperature Route -----
 @app.route('/predict_temperature', methods=['GET'])
 def predict_temperature():
-    if PREDICTIVE_MODEL is None:
+    model = get_predictive_model()
+    if model is None:
         return jsonify({"error": "Prediction model not loaded. Please check backend logs."}), 500
 
     city_name = request.args.get('city')
@@ -901,65 +1136,155 @@ def predict_temperature():
     # Validate all required parameters
     if not all([city_name, humidity is not None, pressure is not None, wind_speed is not None, description, icon, country_code]):
         return jsonify({"error": "Missing one or more required parameters for prediction: city, humidity, pressure, wind_speed, description, icon, country_code"}), 400
-
-    # Initialize a dictionary for all MODEL_FEATURES with initial value 0
-    prediction_features_dict = {feature: 0 for feature in MODEL_FEATURES}
-
-    # Populate numerical/time features
-    prediction_features_dict['humidity'] = humidity
-    prediction_features_dict['pressure'] = pressure
-    prediction_features_dict['wind_speed'] = wind_speed
-    prediction_features_dict['hour_of_day'] = hour_of_day
-    prediction_features_dict['day_of_week'] = day_of_week
-    prediction_features_dict['month'] = month
-
-    # Handle One-Hot Encoded Categorical Features
-    # City
-    city_feature_name = f'city_{city_name}'
-    if city_feature_name in prediction_features_dict:
-        prediction_features_dict[city_feature_name] = 1
-    else:
-        print(f"Warning: City '{city_name}' is not a recognized feature. '{city_feature_name}' not in MODEL_FEATURES. Its one-hot encoding will be 0.")
-
-    # Country
-    country_feature_name = f'country_{country_code}'
-    if country_feature_name in prediction_features_dict:
-        prediction_features_dict[country_feature_name] = 1
-    else:
-        print(f"Warning: Country code '{country_code}' is not a recognized feature. '{country_feature_name}' not in MODEL_FEATURES. Its one-hot encoding will be 0.")
-
-    # Description
-    description_feature_name = f'description_{description}'
-    if description_feature_name in prediction_features_dict:
-        prediction_features_dict[description_feature_name] = 1
-    else:
-        print(f"Warning: Description '{description}' is not a recognized feature. '{description_feature_name}' not in MODEL_FEATURES. Its one-hot encoding will be 0.")
-
-    # Icon
-    icon_feature_name = f'icon_{icon}'
-    if icon_feature_name in prediction_features_dict:
-        prediction_features_dict[icon_feature_name] = 1
-    else:
-        print(f"Warning: Icon '{icon}' is not a recognized feature. '{icon_feature_name}' not in MODEL_FEATURES. Its one-hot encoding will be 0.")
+    if not all(math.isfinite(value) for value in (humidity, pressure, wind_speed)):
+        return jsonify({"error": "humidity, pressure and wind_speed must be finite numbers"}), 400
+
+    # A prediction only depends on the model, the inputs and the current hour/day/month, so it can
+    # be cached until the end of the hour
+    etag = hashlib.blake2b(repr((
+        MODEL_FINGERPRINT, city_name, humidity, pressure, wind_speed, description, icon, country_code,
+        hour_of_day, day_of_week, month
+    )).encode('utf-8'), digest_size=8).hexdigest()
+    seconds_to_next_hour = 3600 - (current_time.minute * 60 + current_time.second)
+    if client_has_current(etag):
+        return with_cache_headers(app.response_class(status=304), etag, seconds_to_next_hour)
 
     try:
-        # Convert the dictionary to a DataFrame with a single row
-        # Ensure the columns are in the exact order as MODEL_FEATURES
-        prediction_input_df = pd.DataFrame([prediction_features_dict])[MODEL_FEATURES]
-    except KeyError as k_err:
-        return jsonify({"error": f"Feature mismatch. Expected feature missing when creating prediction DataFrame: {k_err}. Ensure MODEL_FEATURES list is correct and all expected columns are handled."}), 500
+        # Fill a preallocated input row in MODEL_FEATURES order (numeric features + one-hot columns)
+        with metrics.timed('feature_encode'):
+            prediction_input, unknown_features = FEATURE_ENCODER.encode(
+                (humidity, pressure, wind_speed, hour_of_day, day_of_week, month),
+                {'city': city_name, 'country': country_code, 'description': description, 'icon': icon}
+            )
     except Exception as e:
-        return jsonify({"error": f"Error preparing prediction input DataFrame: {e}"}), 500
+        return jsonify({"error": f"Error preparing prediction input: {e}"}), 500
+
+    for prefix, value in unknown_features:
+        metrics.inc('weather_unknown_features_total', feature=prefix)
+        # Rate limited in logging_setup.py: unseen cities would otherwise log on every request
+        log.warning(UNKNOWN_FEATURE_MESSAGES[prefix], value, extra={"feature": f"{prefix}_{value}"})
 
     try:
-        predicted_temperature = PREDICTIVE_MODEL.predict(prediction_input_df)[0]
+        with metrics.timed('model_predict'):
+            predicted_temperature = model.predict(prediction_input)[0]
         predicted_temperature_celsius = (predicted_temperature - 32) * 5/9  ## yah UPDATE KIYE HAI
-        return jsonify({
+        return with_cache_headers(jsonify({
             "city": city_name,
             "predicted_temperature": round(predicted_temperature_celsius, 2)
-        })
+        }), etag, seconds_to_next_hour)
     except Exception as e:
         return jsonify({"error": f"Error during prediction: {e}. Model might not have all expected features or data type mismatch."}), 500
 
+# ----- Batch Predict Temperature Route -----
+def parse_prediction_row(row):
+    # Validates one batch observation and returns (numeric_values, categories) for FEATURE_ENCODER.
+    # 'collection_timestamp' is optional; historical rows use it for the time features, otherwise "now" is used.
+    if not isinstance(row, dict):
+        raise ValueError("Each observation must be a JSON object")
+    missing = [field for field in PREDICTION_NUMERIC_FIELDS + PREDICTION_TEXT_FIELDS if row.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    try:
+        humidity, pressure, wind_speed = (float(row[field]) for field in PREDICTION_NUMERIC_FIELDS)
+    except (TypeError, ValueError):
+        raise ValueError("humidity, pressure and wind_speed must be numbers")
+    # float() accepts "nan" and "inf", which would come back as null predictions
+    if not all(math.isfinite(value) for value in (humidity, pressure, wind_speed)):
+        raise ValueError("humidity, pressure and wind_speed must be finite numbers")
+
+    timestamp = row.get('collection_timestamp')
+    if timestamp:
+        try:
+            observed_at = datetime.strptime(str(timestamp), "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            raise ValueError(f"Invalid collection_timestamp '{timestamp}', expected YYYY-MM-DD HH:MM:SS")
+    else:
+        observed_at = datetime.now()
+
+    numeric_values = (humidity, pressure, wind_speed, observed_at.hour, observed_at.weekday(), observed_at.month)
+    categories = {
+        'city': str(row['city']),
+        'country': str(row['country_code']),
+        'description': str(row['description']),
+        'icon': str(row['icon'])
+    }
+    return numeric_values, categories
+
+def read_batch_observations():
+    # Accepts either a JSON array of observations or NDJSON (one JSON object per line)
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        rows = []
+        for line in request.get_data(as_text=True).splitlines():
+            line = line.strip()
+            if line:
+                try:
+                    rows.append(app.json.loads(line))
+                except ValueError as e:
+                    rows.append(ValueError(f"Invalid JSON line: {e}"))
+        return rows
+    rows = request.get_json(silent=True)
+    if not isinstance(rows, list):
+        raise ValueError("Request body must be a JSON array of observations or NDJSON")
+    return rows
+
+@app.route('/predict_temperature/batch', methods=['POST'])
+def predict_temperature_batch():
+    model = get_predictive_model()
+    if model is None:
+        return jsonify({"error": "Prediction model not loaded. Please check backend logs."}), 500
+
+    try:
+        rows = read_batch_observations()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if len(rows) > PREDICT_BATCH_MAX_ROWS:
+        return jsonify({"error": f"Too many observations: {len(rows)}. Maximum per request is {PREDICT_BATCH_MAX_ROWS}."}), 413
+
+    results = [None] * len(rows)
+    valid_positions = []
+    parsed_rows = []
+    for position, row in enumerate(rows):
+        try:
+            if isinstance(row, Exception):
+                raise row
+            parsed_rows.append(parse_prediction_row(row))
+            valid_positions.append(position)
+        except ValueError as e:
+            results[position] = {"index": position, "error": str(e)}
+
+    if parsed_rows:
+        # All valid rows go into one matrix so the model is called exactly once
+        encode_started = time.perf_counter()
+        prediction_input = np.zeros((len(parsed_rows), FEATURE_ENCODER.n_features), dtype=np.float64)
+        unknown_counts = {}
+        for matrix_row, (numeric_values, categories) in zip(prediction_input, parsed_rows):
+            for unknown in FEATURE_ENCODER.encode_into(matrix_row, numeric_values, categories):
+                unknown_counts[unknown] = unknown_counts.get(unknown, 0) + 1
+        metrics.observe_stage('feature_encode', time.perf_counter() - encode_started)
+        for (prefix, value), count in unknown_counts.items():
+            metrics.inc('weather_unknown_features_total', count, feature=prefix)
+            log.warning(UNKNOWN_BATCH_FEATURE_MESSAGES[prefix], value, count,
+                        extra={"feature": f"{prefix}_{value}"})
+
+        try:
+            with metrics.timed('model_predict'):
+                predicted_temperatures = model.predict(prediction_input)
+        except Exception as e:
+            return jsonify({"error": f"Error during prediction: {e}. Model might not have all expected features or data type mismatch."}), 500
+
+        predicted_celsius = (predicted_temperatures - 32) * 5/9
+        for position, (numeric_values, categories), temperature in zip(valid_positions, parsed_rows, predicted_celsius):
+            results[position] = {
+                "index": position,
+                "city": categories['city'],
+                "predicted_temperature": round(float(temperature), 2)
+            }
+
+    return jsonify({
+        "count": len(results),
+        "errors": len(results) - len(valid_positions),
+        "results": results
+    })
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=os.environ.get('PORT', 10000))
\ No newline at end of file
@@ -0,0 +1,185 @@
+import argparse
+import itertools
+import os
+import sqlite3
+import time
+from urllib.parse import quote
+
+import db
+from history import parse_time
+from migrations import apply_migrations
+
+# Columnar archive of current_weather. Rows are written to Parquet files partitioned by city and
+# month (hive layout: <root>/city=<city>/month=YYYY-MM/data.parquet), which analysis and model
+# training can scan much faster than the row-oriented SQLite table. Old rows can optionally be
+# pruned from SQLite once they are archived, which keeps the live database small.
+#
+# pyarrow is only needed for this module, not for the web app: pip install -r requirements-archive.txt
+#
+#   python archive.py --before 2024-01-01                        # export rows collected before then
+#   python archive.py --prune --older-than-days 90 --vacuum      # export, then delete them from SQLite
+#
+# Pruning always needs an explicit cutoff, so the rows the app is still collecting are never deleted.
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+DEFAULT_ARCHIVE_DIR = os.getenv('WEATHER_ARCHIVE_DIR', os.path.join(db.BASE_DIR, 'archive'))
+PARTITION_FILE = 'data.parquet'
+
+# city and month come from the partition path, so they are not stored inside the files
+ARCHIVE_COLUMNS = (
+    'country', 'description', 'feels_like', 'humidity', 'icon',
+    'pressure', 'temperature', 'wind_speed', 'collection_timestamp', 'collected_at'
+)
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("pyarrow is required for the Parquet archive. Install it with 'pip install pyarrow'.")
+
+
+def archive_schema():
+    return pa.schema([
+        ('country', pa.string()),
+        ('description', pa.string()),
+        ('feels_like', pa.float64()),
+        ('humidity', pa.int64()),
+        ('icon', pa.string()),
+        ('pressure', pa.int64()),
+        ('temperature', pa.float64()),
+        ('wind_speed', pa.float64()),
+        ('collection_timestamp', pa.string()),
+        ('collected_at', pa.timestamp('s', tz='UTC')),
+    ])
+
+
+def partition_path(root, city, month):
+    # City names are URI-encoded the same way pyarrow decodes hive partition segments
+    return os.path.join(root, f"city={quote(city, safe=' ')}", f"month={month}", PARTITION_FILE)
+
+
+def write_partition(path, rows):
+    # Merges `rows` into the partition file (if any), keeping one row per collection_timestamp with
+    # the newest values winning, and replaces the file atomically.
+    schema = archive_schema()
+    columns = list(zip(*rows))
+    table = pa.table([pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema)
+
+    if os.path.exists(path):
+        combined = pa.concat_tables([pq.read_table(path, schema=schema), table])
+        combined = combined.append_column('__row', pa.array(range(combined.num_rows), type=pa.int64()))
+        keep = combined.group_by('collection_timestamp').aggregate([('__row', 'max')])['__row_max']
+        table = combined.take(keep).drop_columns(['__row'])
+    table = table.sort_by('collected_at')
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+    return table.num_rows
+
+
+def export_archive(root=DEFAULT_ARCHIVE_DIR, database=None, before=None, prune=False, vacuum=False):
+    _require_pyarrow()
+    if before is None:
+        if prune:
+            raise ValueError("Pruning needs a cutoff: pass before (--before or --older-than-days)")
+        before = int(time.time()) + 1
+    conn = db.connect(database)
+    started = time.perf_counter()
+    exported = pruned = partitions = 0
+    try:
+        apply_migrations(conn)
+        cities = [row[0] for row in conn.execute('SELECT DISTINCT city FROM current_weather')]
+        select_columns = ', '.join(ARCHIVE_COLUMNS)
+        for city in cities:
+            # Walks the (city, collected_at) index, so rows arrive grouped by month
+            cursor = conn.execute(f'''
+                SELECT strftime('%Y-%m', collected_at, 'unixepoch') AS month, {select_columns}
+                FROM current_weather
+                WHERE city = ? AND collected_at < ?
+                ORDER BY collected_at
+            ''', (city, before))
+            month, rows = None, []
+            for row in itertools.chain(cursor, [(None,)]):
+                if row[0] != month and rows:
+                    write_partition(partition_path(root, city, month), rows)
+                    exported += len(rows)
+                    partitions += 1
+                    rows = []
+                month = row[0]
+                if month is not None:
+                    rows.append(row[1:])
+            if prune:
+                # Only after every partition of this city has been written, and not while the
+                # SELECT above is still stepping through the same table
+                with conn:
+                    pruned += conn.execute(
+                        'DELETE FROM current_weather WHERE city = ? AND collected_at < ?', (city, before)
+                    ).rowcount
+        if prune and vacuum:
+            conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Exported {exported} rows into {partitions} partitions under {root} in {elapsed:.2f}s"
+          + (f", pruned {pruned} rows from SQLite" if prune else ""))
+    return exported
+
+
+def read_archive(root=DEFAULT_ARCHIVE_DIR, city=None, start=None, end=None, columns=None):
+    # Returns a pyarrow Table with city and month added from the partition paths. Files are
+    # memory-mapped, and the city filter only opens that city's partitions. Call .to_pandas()
+    # on the result for a DataFrame.
+    _require_pyarrow()
+    dataset = ds.dataset(
+        root,
+        format='parquet',
+        partitioning='hive',
+        filesystem=pafs.LocalFileSystem(use_mmap=True)
+    )
+    condition = None
+    for expression in (
+        ds.field('city') == city if city is not None else None,
+        ds.field('collected_at') >= pa.scalar(start, type=pa.timestamp('s', tz='UTC')) if start is not None else None,
+        ds.field('collected_at') < pa.scalar(end, type=pa.timestamp('s', tz='UTC')) if end is not None else None,
+    ):
+        if expression is not None:
+            condition = expression if condition is None else condition & expression
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export current_weather into city/month partitioned Parquet files.")
+    parser.add_argument('--db', default=db.DATABASE_NAME, help="SQLite database to export from")
+    parser.add_argument('--out', default=DEFAULT_ARCHIVE_DIR, help="Archive root directory")
+    parser.add_argument('--before', default=None,
+                        help="Only export rows collected before this time (epoch, YYYY-MM-DD or YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument('--older-than-days', type=float, default=None,
+                        help="Only export rows collected more than this many days ago (instead of --before)")
+    parser.add_argument('--prune', action='store_true',
+                        help="Delete exported rows from SQLite (needs --before or --older-than-days)")
+    parser.add_argument('--vacuum', action='store_true', help="VACUUM the database after pruning")
+    args = parser.parse_args()
+    if args.before and args.older_than_days is not None:
+        parser.error("use either --before or --older-than-days, not both")
+    if args.prune and not args.before and args.older_than_days is None:
+        parser.error("--prune needs --before or --older-than-days, otherwise it would delete every row")
+    try:
+        if args.older_than_days is not None:
+            before = int(time.time() - args.older_than_days * 86400)
+        else:
+            before = parse_time(args.before) if args.before else None
+        export_archive(args.out, args.db, before, args.prune, args.vacuum)
+    except (RuntimeError, ValueError, sqlite3.Error) as e:
+        print(f"Archive export failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import asyncio
+import contextlib
+import time
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from werkzeug.http import http_date, parse_accept_header, quote_etag
+from werkzeug.sansio.http import is_resource_modified
+
+import app as wsgi
+import async_upstream
+import compression
+import metrics
+import profiling
+from forecast import summarize_forecast
+from upstream import current_weather_info, weather_validators
+
+# Async serving mode. /weather is handled natively here: its upstream calls are awaited on the
+# event loop (async_upstream.py), so one worker can hold hundreds of lookups in flight instead of
+# one per thread. Every other route ('/', /predict_temperature, /history, static files, ...) is
+# the Flask app from app.py, run on a thread pool behind WSGIMiddleware; those routes do CPU or
+# SQLite work rather than waiting on the network, so they gain nothing from being async.
+# Responses are the same as under the WSGI app, including ETags, Cache-Control and compression.
+#
+#   pip install -r requirements-asgi.txt                 # starlette, uvicorn, uvicorn-worker, httpx, a2wsgi
+#   gunicorn asgi:app -k uvicorn_worker.UvicornWorker    # same gunicorn.conf.py as the WSGI app
+#   uvicorn asgi:app --port 10000                        # local development
+#
+# Cross-worker single-flight (SINGLE_FLIGHT_DIR) is not used by the async /weather route;
+# concurrent misses for a city are still coalesced inside each worker.
+
+
+def json_response(request, obj, status=200, etag=None, max_age=None, last_modified=None):
+    # The body comes from the Flask app's JSON provider, so it is byte for byte what jsonify sends.
+    # obj=None makes a 304 carrying only the validators.
+    body = wsgi.app.json.response(obj).get_data() if obj is not None else b''
+    headers = {}
+    if etag is not None:
+        headers['ETag'] = quote_etag(etag)
+        headers['Cache-Control'] = f'public, max-age={max_age}'
+        if last_modified is not None:
+            headers['Last-Modified'] = http_date(int(last_modified))
+
+    if compression.RESPONSE_COMPRESSION:
+        # Same rules as compression.compress_response: 304s get the Vary and weak ETag of the 200
+        headers['Vary'] = 'Accept-Encoding'
+        encoding = compression.choose_encoding(parse_accept_header(request.headers.get('accept-encoding')))
+        if encoding is not None:
+            if etag is not None:
+                headers['ETag'] = quote_etag(etag, weak=True)
+            if obj is not None and len(body) >= compression.COMPRESS_MIN_SIZE:
+                body = compression.compress(body, encoding)
+                headers['Content-Encoding'] = encoding
+
+    return Response(body, status_code=status if obj is not None else 304, headers=headers,
+                    media_type=wsgi.app.json.mimetype if obj is not None else None)
+
+
+def client_has_current(request, etag, last_modified):
+    return not is_resource_modified(
+        http_if_none_match=request.headers.get('if-none-match'),
+        http_if_modified_since=request.headers.get('if-modified-since'),
+        etag=etag,
+        last_modified=http_date(int(last_modified))
+    )
+
+
+async def save_observation(city, weather_info):
+    if wsgi.OBSERVATION_WRITER is None:
+        # Inline SQLite write (ASYNC_DB_WRITES=0): keep it off the event loop
+        await asyncio.to_thread(wsgi.save_observation, city, weather_info)
+    else:
+        wsgi.save_observation(city, weather_info)
+
+
+async def get_weather(request):
+    # Per-request profiling (X-Profile) covers the Flask routes only; PROFILING_CONTINUOUS sampling
+    # covers this one as well
+    profiling.ensure_continuous()
+    started = time.perf_counter()
+    response = await weather_response(request)
+    metrics.observe(metrics.REQUEST_SECONDS, time.perf_counter() - started,
+                    route='/weather', method=request.method, status=str(response.status_code))
+    return response
+
+
+async def weather_response(request):
+    city = request.query_params.get('city')
+    if not city:
+        return json_response(request, {"error": "City parameter is required"}, 400)
+
+    params = {
+        "q": city,
+        "appid": wsgi.OPENWEATHER_API_KEY,
+        "units": "metric"
+    }
+
+    try:
+        current_data, forecast_data, fresh = await async_upstream.fetch_current_and_forecast(params)
+        weather_info = current_weather_info(current_data)
+        if fresh:
+            await save_observation(city, weather_info)
+
+        etag, last_modified, max_age = weather_validators(city, current_data, forecast_data)
+        if client_has_current(request, etag, last_modified):
+            return json_response(request, None, etag=etag, max_age=max_age, last_modified=last_modified)
+        return json_response(request, {
+            "current_weather": weather_info,
+            "forecast": summarize_forecast(forecast_data)
+        }, etag=etag, max_age=max_age, last_modified=last_modified)
+    except Exception as e:
+        # Same messages and status codes as the Flask /weather route
+        error_msg, status_code = wsgi.describe_upstream_error(e)
+        return json_response(request, {"error": error_msg}, status_code)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await async_upstream.close_client()
+
+
+app = Starlette(
+    routes=[
+        Route('/weather', get_weather),
+        Mount('/', app=WSGIMiddleware(wsgi.app)),
+    ],
+    # Same policy as CORS(app) in app.py; also answers preflights for the async routes
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan
+)
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import time
+
+import httpx
+import requests
+
+import upstream
+from cache import normalize_city
+from singleflight import AsyncSingleFlight
+
+# Non-blocking version of upstream.fetch_current_and_forecast for the ASGI app (asgi.py).
+# It shares the response caches and settings of upstream.py, but calls OpenWeatherMap with an
+# httpx.AsyncClient, so a worker can have hundreds of upstream requests in flight at once instead
+# of one per thread. Errors are raised as the same requests exceptions upstream.py raises, so
+# both apps map them to the same messages and status codes.
+#
+# Needs httpx: pip install httpx
+
+# Upper bound on concurrent upstream connections per worker
+ASYNC_UPSTREAM_CONNECTIONS = int(os.getenv('ASYNC_UPSTREAM_CONNECTIONS', '200'))
+RETRY_STATUSES = (500, 502, 503, 504)
+
+single_flight = AsyncSingleFlight()
+
+# Requests beyond the limit wait here rather than inside httpx's connection pool, whose queueing
+# gets very slow with hundreds of waiters (600 queued calls took ~20s instead of ~2s locally)
+_upstream_slots = asyncio.Semaphore(ASYNC_UPSTREAM_CONNECTIONS)
+
+_client = None
+
+
+def get_client():
+    # Created on first use, inside the worker's event loop
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(upstream.UPSTREAM_READ_TIMEOUT, connect=upstream.UPSTREAM_CONNECT_TIMEOUT),
+            # Limits go on the transport: a client given its own transport ignores `limits`.
+            # The transport retries failed connection attempts; 5xx responses are retried in fetch_json.
+            transport=httpx.AsyncHTTPTransport(
+                retries=upstream.UPSTREAM_RETRIES,
+                limits=httpx.Limits(
+                    max_connections=ASYNC_UPSTREAM_CONNECTIONS,
+                    max_keepalive_connections=upstream.UPSTREAM_POOL_SIZE
+                )
+            )
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _http_error(response):
+    # Same message as requests' Response.raise_for_status
+    kind = 'Client' if response.status_code < 500 else 'Server'
+    return requests.exceptions.HTTPError(
+        f"{response.status_code} {kind} Error: {response.reason_phrase} for url: {response.url}",
+        response=response
+    )
+
+
+async def fetch_json(endpoint, params):
+    # Like upstream.fetch_json: 5xx responses are retried with exponential backoff, read timeouts
+    # are not
+    started = time.perf_counter()
+    try:
+        for attempt in range(upstream.UPSTREAM_RETRIES + 1):
+            async with _upstream_slots:
+                response = await get_client().get(f"{upstream.BASE_URL}{endpoint}", params=params)
+            if response.status_code not in RETRY_STATUSES or attempt == upstream.UPSTREAM_RETRIES:
+                break
+            await asyncio.sleep(upstream.UPSTREAM_BACKOFF * 2 ** attempt)
+        if response.status_code >= 400:
+            raise _http_error(response)
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise requests.exceptions.InvalidJSONError(str(e))
+    except requests.exceptions.RequestException as e:
+        upstream.record_upstream_call(endpoint, started, e)
+        raise
+    except httpx.HTTPError as e:
+        if isinstance(e, httpx.ConnectTimeout):
+            error = requests.exceptions.ConnectTimeout(str(e) or 'Connection timed out')
+        elif isinstance(e, httpx.TimeoutException):
+            error = requests.exceptions.ReadTimeout(str(e) or 'Read timed out')
+        elif isinstance(e, httpx.NetworkError):
+            error = requests.exceptions.ConnectionError(str(e) or 'Connection failed')
+        else:
+            error = requests.exceptions.RequestException(str(e))
+        upstream.record_upstream_call(endpoint, started, error)
+        raise error
+    upstream.record_upstream_call(endpoint, started)
+    return data
+
+
+async def _fetch_both(params):
+    current_task = asyncio.ensure_future(fetch_json('weather', params))
+    forecast_task = asyncio.ensure_future(fetch_json('forecast', params))
+    try:
+        current_data = await current_task
+    except BaseException:
+        # A failed 'weather' call means no forecast is needed
+        if not forecast_task.cancel() and not forecast_task.cancelled():
+            forecast_task.exception()  # already finished; mark a possible error as handled
+        raise
+    return current_data, await forecast_task
+
+
+async def _fetch_missing(key, params):
+    # Same steps as upstream._fetch_missing
+    current_entry = upstream.current_weather_cache.peek(key)
+    forecast_entry = upstream.forecast_cache.peek(key)
+    current_data = current_entry.value if current_entry else None
+    forecast_data = forecast_entry.value if forecast_entry else None
+    fetched_current = current_data is None
+
+    if current_data is None and forecast_data is None:
+        current_data, forecast_data = await _fetch_both(params)
+        upstream.store_current(key, current_data)
+        upstream.store_forecast(key, forecast_data)
+    elif current_data is None:
+        current_data = await fetch_json('weather', params)
+        upstream.store_current(key, current_data)
+    elif forecast_data is None:
+        forecast_data = await fetch_json('forecast', params)
+        upstream.store_forecast(key, forecast_data)
+
+    return current_data, forecast_data, fetched_current
+
+
+async def fetch_current_and_forecast(params):
+    # Returns (current_data, forecast_data, fresh), see upstream.fetch_current_and_forecast
+    key = normalize_city(params["q"])
+    current_data = upstream.current_weather_cache.get(key)
+    forecast_data = upstream.forecast_cache.get(key)
+    if current_data is not None and forecast_data is not None:
+        return current_data, forecast_data, False
+
+    (current_data, forecast_data, fetched_current), shared = await single_flight.do(
+        key, lambda: _fetch_missing(key, params)
+    )
+    return current_data, forecast_data, fetched_current and not shared
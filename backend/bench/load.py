@@ -0,0 +1,296 @@
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import threading
+import time
+
+import requests
+
+# Load generator for the backend. Runs one or more scenarios against a running server at a fixed
+# concurrency and prints (or writes) one JSON document with latency percentiles, requests per
+# second and status codes per scenario.
+#
+#   python -m bench.load --base-url http://127.0.0.1:10000 --scenario weather --concurrency 32 --duration 20
+#   python -m bench.load ... --output after.json --baseline before.json --max-regression 0.1
+#
+# With --baseline the run fails (exit status 1) when a scenario's p95 latency is more than
+# --max-regression slower, or its throughput that much lower, than in the baseline file.
+# Client threads share the machine with the server, so compare runs made on the same machine only.
+# requests costs the client ~2ms of CPU per call, so one client process tops out at a few hundred
+# requests/s; on a multi-core machine spread the threads with --processes, or the client is what
+# gets measured.
+#
+# New endpoints get a scenario by adding a function to SCENARIOS: it is called with the parsed
+# arguments and a random.Random, and returns the keyword arguments for requests.Session.request.
+
+KNOWN_CITIES = ['Dubai', 'Moscow', 'Mumbai', 'New York', 'Paris', 'Sydney', 'Tokyo', 'Toronto']
+DESCRIPTIONS = ['clear sky', 'few clouds', 'light rain', 'mist', 'overcast clouds']
+ICONS = ['02n', '04d', '04n', '10n', '50n']
+COUNTRIES = ['AU', 'CA', 'FR', 'IN', 'JP', 'RU', 'TH', 'US']
+
+
+def city_pool(args):
+    # --cities distinct names; the known ones first, so small pools stay realistic
+    extra = [f'Bench City {n:04d}' for n in range(max(0, args.cities - len(KNOWN_CITIES)))]
+    return (KNOWN_CITIES + extra)[:args.cities]
+
+
+def observation(args, rng):
+    # --unknown-ratio of the observations use a city the model was not trained on
+    city = f'Unseen City {rng.randrange(100000)}' if rng.random() < args.unknown_ratio else rng.choice(KNOWN_CITIES)
+    return {
+        "city": city,
+        "humidity": rng.randint(20, 100),
+        "pressure": rng.randint(990, 1030),
+        "wind_speed": round(rng.uniform(0, 15), 1),
+        "description": rng.choice(DESCRIPTIONS),
+        "icon": rng.choice(ICONS),
+        "country_code": rng.choice(COUNTRIES)
+    }
+
+
+def weather(args, rng):
+    return {"method": "GET", "url": "/weather", "params": {"city": rng.choice(args.city_pool)}}
+
+
+def weather_multi(args, rng):
+    cities = rng.sample(args.city_pool, min(args.multi_cities, len(args.city_pool)))
+    return {"method": "GET", "url": "/weather/multi", "params": {"cities": ",".join(cities)}}
+
+
+def predict(args, rng):
+    return {"method": "GET", "url": "/predict_temperature", "params": observation(args, rng)}
+
+
+def predict_batch(args, rng):
+    return {"method": "POST", "url": "/predict_temperature/batch",
+            "json": [observation(args, rng) for _ in range(args.batch_size)]}
+
+
+SCENARIOS = {
+    'weather': weather,
+    'weather_multi': weather_multi,
+    'predict': predict,
+    'predict_batch': predict_batch,
+}
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, statuses, errors, elapsed):
+    latencies = sorted(latencies)
+    completed = len(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    return {
+        "requests": completed,
+        "errors": errors,
+        "rps": round(completed / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 0.50)),
+            "p95": ms(percentile(latencies, 0.95)),
+            "p99": ms(percentile(latencies, 0.99)),
+            "mean": ms(sum(latencies) / completed) if completed else None,
+            "max": ms(latencies[-1]) if completed else None
+        },
+        "status": {str(code): count for code, count in sorted(statuses.items())}
+    }
+
+
+def drive(args, name, seeds, request_budget, measure_from, measure_until):
+    # Runs one client thread per seed in this process. Requests sent before `measure_from` (wall
+    # clock, so all processes agree) are warm-up and not recorded. Measuring stops at
+    # `measure_until`, or after `request_budget` requests when that is not None.
+    build = SCENARIOS[name]
+    lock = threading.Lock()
+    remaining = [request_budget]
+    results = []
+
+    def take_request():
+        if request_budget is None:
+            return time.time() < measure_until
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+        return True
+
+    def send(session, rng):
+        request = build(args, rng)
+        request["url"] = args.base_url + request["url"]
+        response = session.request(timeout=args.timeout, **request)
+        response.content
+        return response
+
+    def worker(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        latencies, statuses, errors = [], {}, 0
+        while time.time() < measure_from:
+            try:
+                send(session, rng)
+            except requests.RequestException:
+                time.sleep(0.01)
+        while take_request():
+            started = time.perf_counter()
+            try:
+                response = send(session, rng)
+            except requests.RequestException:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code >= 500:
+                errors += 1
+        session.close()
+        with lock:
+            results.append((latencies, statuses, errors))
+
+    threads = [threading.Thread(target=worker, args=(seed,), daemon=True) for seed in seeds]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies, statuses, errors = [], {}, 0
+    for worker_latencies, worker_statuses, worker_errors in results:
+        latencies.extend(worker_latencies)
+        for code, count in worker_statuses.items():
+            statuses[code] = statuses.get(code, 0) + count
+        errors += worker_errors
+    return latencies, statuses, errors, time.time()
+
+
+def run_scenario(args, name):
+    seeds = [args.seed + n for n in range(args.concurrency)]
+    if args.processes <= 1:
+        measure_from = time.time() + args.warmup
+        parts = [drive(args, name, seeds, args.requests or None, measure_from, measure_from + args.duration)]
+    else:
+        groups = [seeds[n::args.processes] for n in range(args.processes)]
+        if args.requests:
+            budgets = [args.requests // len(groups) + (n < args.requests % len(groups)) for n in range(len(groups))]
+        else:
+            budgets = [None] * len(groups)
+        jobs = [(group, budget) for group, budget in zip(groups, budgets) if group and budget != 0]
+        with multiprocessing.Pool(len(jobs)) as pool:
+            # A little slack so every process is running before the measured window opens
+            measure_from = time.time() + args.warmup + 0.2
+            parts = pool.starmap(drive, [(args, name, group, budget, measure_from, measure_from + args.duration)
+                                         for group, budget in jobs])
+
+    latencies, statuses, errors = [], {}, 0
+    for part_latencies, part_statuses, part_errors, _ in parts:
+        latencies.extend(part_latencies)
+        for code, count in part_statuses.items():
+            statuses[code] = statuses.get(code, 0) + count
+        errors += part_errors
+    elapsed = max(finished for _, _, _, finished in parts) - measure_from
+    return summarize(latencies, statuses, errors, elapsed)
+
+
+def compare(report, baseline, max_regression):
+    # Returns a list of human-readable regressions against a previous report
+    regressions = []
+    for name, result in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        p95, before_p95 = result["latency_ms"]["p95"], before["latency_ms"]["p95"]
+        if p95 is not None and before_p95 and p95 > before_p95 * (1 + max_regression):
+            regressions.append(f"{name}: p95 {p95}ms vs {before_p95}ms in the baseline")
+        if before["rps"] and result["rps"] < before["rps"] * (1 - max_regression):
+            regressions.append(f"{name}: {result['rps']} requests/s vs {before['rps']} in the baseline")
+        if result["errors"] > before["errors"]:
+            regressions.append(f"{name}: {result['errors']} errors vs {before['errors']} in the baseline")
+    return regressions
+
+
+def mock_calls(stats_url):
+    try:
+        return requests.get(stats_url, timeout=5).json()["calls"]
+    except (requests.RequestException, ValueError, KeyError):
+        return None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Load generator for the weather backend")
+    parser.add_argument('--base-url', default='http://127.0.0.1:10000')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="scenario to run, repeatable (default: weather and predict)")
+    parser.add_argument('--concurrency', type=int, default=16, help="client threads sending requests")
+    parser.add_argument('--processes', type=int, default=1,
+                        help="client processes the threads are spread over")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument('--requests', type=int, default=0, help="fixed number of requests per scenario instead of --duration")
+    parser.add_argument('--warmup', type=float, default=2.0, help="seconds of unmeasured requests before each scenario")
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--cities', type=int, default=50, help="distinct cities /weather is asked for")
+    parser.add_argument('--multi-cities', type=int, default=10, help="cities per /weather/multi request")
+    parser.add_argument('--batch-size', type=int, default=100, help="observations per batch prediction")
+    parser.add_argument('--unknown-ratio', type=float, default=0.1,
+                        help="fraction of prediction inputs with a city the model does not know")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--mock-stats-url', help="mock_openweather /_stats URL, to report upstream calls")
+    parser.add_argument('--output', help="write the JSON report here as well as to stdout")
+    parser.add_argument('--baseline', help="earlier report to compare against")
+    parser.add_argument('--max-regression', type=float, default=0.10)
+    return parser
+
+
+def run(args, extra=None):
+    args.base_url = args.base_url.rstrip('/')
+    args.city_pool = city_pool(args)
+    report = {
+        "started_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        "base_url": args.base_url,
+        "config": {
+            "concurrency": args.concurrency, "processes": args.processes, "duration": args.duration, "requests": args.requests,
+            "warmup": args.warmup, "cities": args.cities, "batch_size": args.batch_size,
+            "unknown_ratio": args.unknown_ratio, "seed": args.seed
+        },
+        "scenarios": {}
+    }
+    report.update(extra or {})
+    for name in args.scenario or ['weather', 'predict']:
+        calls_before = mock_calls(args.mock_stats_url) if args.mock_stats_url else None
+        result = run_scenario(args, name)
+        if calls_before is not None:
+            calls_after = mock_calls(args.mock_stats_url) or {}
+            result["upstream_calls"] = {endpoint: count - calls_before.get(endpoint, 0)
+                                        for endpoint, count in calls_after.items()
+                                        if count != calls_before.get(endpoint, 0)}
+        report["scenarios"][name] = result
+    return report
+
+
+def finish(args, report):
+    # Prints and saves the report; returns the exit status
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return finish(args, run(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
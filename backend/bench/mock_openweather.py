@@ -0,0 +1,174 @@
+import argparse
+import copy
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-in for the OpenWeatherMap endpoints the backend calls ('weather', 'forecast' and
+# 'group'), so load tests cost no API quota and do not depend on the real service's latency.
+# Responses are the recorded payloads in bench/fixtures with the city name, a stable city id and
+# the timestamps changed per request; every response waits --latency-ms (+/- --jitter-ms) first.
+#
+#   python -m bench.mock_openweather --port 8765 --latency-ms 80
+#   OPENWEATHER_BASE_URL=http://127.0.0.1:8765/ gunicorn app:app
+#
+# GET /_stats returns the number of calls per endpoint, so a benchmark can report how many
+# upstream calls its requests caused.
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+NOT_FOUND_BODY = b'{"cod":"404","message":"city not found"}'
+SERVER_ERROR_BODY = b'{"cod":"503","message":"Service Unavailable"}'
+
+
+def load_fixture(name, directory=FIXTURES_DIR):
+    with open(os.path.join(directory, f'{name}.json')) as f:
+        return json.load(f)
+
+
+def city_id(city):
+    # Same id for the same city on every run, like the real API
+    return 1000000 + zlib.crc32(city.strip().lower().encode('utf-8')) % 9000000
+
+
+class MockOpenWeather:
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, not_found=('nowhere',), fixtures_dir=FIXTURES_DIR):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.not_found = {city.lower() for city in not_found}
+        self._weather = load_fixture('weather', fixtures_dir)
+        self._forecast = load_fixture('forecast', fixtures_dir)
+        # Recorded timestamps are moved to the present, so forecasts start today and cache headers
+        # derived from them look like live data. Whole 3-hour steps keep the forecast slots aligned.
+        self._time_shift = (int(time.time()) - self._weather['dt']) // 10800 * 10800
+        self._names = {}
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self.calls = {}
+
+    def _current(self, name):
+        data = copy.deepcopy(self._weather)
+        data['name'] = name
+        data['id'] = city_id(name)
+        data['dt'] += self._time_shift
+        for key in ('sunrise', 'sunset'):
+            data['sys'][key] += self._time_shift
+        return data
+
+    def _forecast_for(self, name):
+        data = copy.deepcopy(self._forecast)
+        data['city'].update(name=name, id=city_id(name))
+        for item in data['list']:
+            item['dt'] += self._time_shift
+            item['dt_txt'] = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(item['dt']))
+        return data
+
+    def _body(self, endpoint, name):
+        # Serialized once per city and endpoint; the mock should not be what a benchmark measures
+        key = (endpoint, name)
+        body = self._bodies.get(key)
+        if body is None:
+            data = self._current(name) if endpoint == 'weather' else self._forecast_for(name)
+            body = self._bodies[key] = json.dumps(data).encode('utf-8')
+        return body
+
+    def respond(self, endpoint, query):
+        # Returns (status, body) for one upstream call
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            return 503, SERVER_ERROR_BODY
+
+        if endpoint in ('weather', 'forecast'):
+            city = query.get('q', [''])[0].strip()
+            if not city or city.lower() in self.not_found:
+                return 404, NOT_FOUND_BODY
+            name = city.split(',')[0].title()
+            with self._lock:
+                self._names[city_id(name)] = name
+            return 200, self._body(endpoint, name)
+
+        if endpoint == 'group':
+            ids = [int(value) for value in query.get('id', [''])[0].split(',') if value.strip().isdigit()]
+            cities = [self._current(self._names.get(id_, f'City {id_}')) for id_ in ids]
+            for data, id_ in zip(cities, ids):
+                data['id'] = id_
+            return 200, json.dumps({"cnt": len(cities), "list": cities}).encode('utf-8')
+
+        return 404, b'{"cod":"404","message":"Internal error"}'
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real API, so the backend's connection pool behaves as in production
+    protocol_version = 'HTTP/1.1'
+    mock = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/_stats':
+            with self.mock._lock:
+                calls = dict(self.mock.calls)
+            self._send(200, json.dumps({"calls": calls}).encode('utf-8'))
+            return
+        endpoint = url.path.rstrip('/').rsplit('/', 1)[-1]
+        self._send(*self.mock.respond(endpoint, parse_qs(url.query)))
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open many connections at once
+    request_queue_size = 1024
+
+
+def serve(mock, host='127.0.0.1', port=8765):
+    # Starts the server on a background thread and returns it; port=0 picks a free port
+    handler = type('MockHandler', (Handler,), {'mock': mock})
+    server = MockServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name='mock-openweather', daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock OpenWeatherMap API for offline load tests")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=80.0, help="delay before every response")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="random +/- added to the latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of calls answered with 503")
+    parser.add_argument('--not-found', action='append', default=None,
+                        help="city answered with 404 (repeatable, default 'nowhere')")
+    parser.add_argument('--fixtures', default=FIXTURES_DIR)
+    args = parser.parse_args(argv)
+
+    mock = MockOpenWeather(args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate,
+                           args.not_found or ('nowhere',), args.fixtures)
+    server = serve(mock, args.host, args.port)
+    print(f"Mock OpenWeatherMap on http://{args.host}:{server.server_address[1]}/ "
+          f"(latency {args.latency_ms:g}ms +/- {args.jitter_ms:g}ms)", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import json
+import os
+import sys
+
+import requests
+from dotenv import load_dotenv
+
+from bench.mock_openweather import FIXTURES_DIR
+
+# Refreshes the payloads mock_openweather replays by recording one real 'weather' and 'forecast'
+# response. Uses two calls of API quota. Run from the backend directory:
+#
+#   OPENWEATHER_API_KEY=... python -m bench.record_fixtures --city London
+
+API_URL = "http://api.openweathermap.org/data/2.5/"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record OpenWeatherMap responses for the mock API")
+    parser.add_argument('--city', default='London')
+    parser.add_argument('--output', default=FIXTURES_DIR)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    api_key = os.getenv('OPENWEATHER_API_KEY')
+    if not api_key:
+        print("OPENWEATHER_API_KEY is not set", file=sys.stderr)
+        return 1
+
+    for endpoint in ('weather', 'forecast'):
+        response = requests.get(f"{API_URL}{endpoint}", params={"q": args.city, "appid": api_key, "units": "metric"}, timeout=10)
+        response.raise_for_status()
+        path = os.path.join(args.output, f'{endpoint}.json')
+        with open(path, 'w') as f:
+            json.dump(response.json(), f, indent=1)
+            f.write('\n')
+        print(f"Saved {endpoint} for {args.city} to {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
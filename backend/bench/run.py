@@ -0,0 +1,135 @@
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from bench import load
+
+# One-command benchmark: starts the mock OpenWeatherMap API, starts the backend against it with a
+# throwaway copy of the database, runs bench.load and stops everything again. Takes the options of
+# bench.load plus the ones below. Run from the backend directory:
+#
+#   python -m bench.run --server gunicorn --scenario weather --scenario predict --output results.json
+#   python -m bench.run --server asgi --scenario weather --concurrency 64 --baseline results.json
+#
+# --server asgi needs the packages in requirements-asgi.txt.
+#
+# Environment variables are passed on to the server, so any setting can be benchmarked with and
+# without, e.g. RESPONSE_COMPRESSION=0 python -m bench.run ...
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER_COMMANDS = {
+    'gunicorn': ['gunicorn', 'app:app'],
+    'asgi': ['gunicorn', 'asgi:app', '-k', 'uvicorn_worker.UvicornWorker'],
+    'flask': [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--without-threads'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(name, port):
+    if name == 'flask':
+        return SERVER_COMMANDS[name] + ['--port', str(port)]
+    return SERVER_COMMANDS[name] + ['--bind', f'127.0.0.1:{port}']
+
+
+def wait_until_ready(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[0]} exited with status {process.returncode} before it was ready")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"Nothing answered on {url} within {timeout}s")
+
+
+def main(argv=None):
+    parser = load.build_parser()
+    parser.description = "Start the mock API and the backend, then run the load generator"
+    parser.add_argument('--server', choices=sorted(SERVER_COMMANDS), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers (WEB_CONCURRENCY)")
+    parser.add_argument('--threads', type=int, default=4, help="threads per gunicorn worker (GUNICORN_THREADS)")
+    parser.add_argument('--latency-ms', type=float, default=80.0, help="mock upstream latency")
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--server-log', help="file for the server's output (default: discarded)")
+    args = parser.parse_args(argv)
+
+    # The mock runs in its own process: inside this one it would compete with the client threads
+    # for the GIL and its latency would grow with the load
+    mock_port = free_port()
+    mock_url = f'http://127.0.0.1:{mock_port}/'
+    mock = subprocess.Popen([
+        sys.executable, '-m', 'bench.mock_openweather', '--port', str(mock_port),
+        '--latency-ms', str(args.latency_ms), '--jitter-ms', str(args.jitter_ms), '--error-rate', str(args.error_rate)
+    ], cwd=BACKEND_DIR, stdout=subprocess.DEVNULL)
+
+    work_dir = tempfile.mkdtemp(prefix='weather-bench-')
+    database = os.path.join(work_dir, 'weather_data.db')
+    source_database = os.environ.get('WEATHER_DB_PATH', os.path.join(BACKEND_DIR, 'weather_data.db'))
+    if os.path.exists(source_database):
+        shutil.copy(source_database, database)
+
+    port = free_port()
+    env = dict(os.environ)
+    env.setdefault('WEB_CONCURRENCY', str(args.workers))
+    env.setdefault('GUNICORN_THREADS', str(args.threads))
+    env.setdefault('LOG_LEVEL', 'WARNING')
+    env.update({
+        'OPENWEATHER_BASE_URL': mock_url,
+        'OPENWEATHER_API_KEY': env.get('BENCH_API_KEY', 'bench'),
+        'WEATHER_DB_PATH': database,
+        'METRICS_DIR': os.path.join(work_dir, 'metrics'),
+        'PYTHONUNBUFFERED': '1'
+    })
+    log_file = open(args.server_log, 'w') if args.server_log else subprocess.DEVNULL
+    # Own process group, so gunicorn and all of its workers are stopped together
+    process = subprocess.Popen(server_command(args.server, port), cwd=BACKEND_DIR, env=env,
+                               stdout=log_file, stderr=subprocess.STDOUT, start_new_session=True)
+    try:
+        args.base_url = f'http://127.0.0.1:{port}'
+        args.mock_stats_url = f'{mock_url}_stats'
+        wait_until_ready(args.mock_stats_url, mock)
+        wait_until_ready(f'{args.base_url}/metrics', process)
+        report = load.run(args, extra={"server": {
+            "kind": args.server,
+            "workers": int(env['WEB_CONCURRENCY']),
+            "threads": int(env['GUNICORN_THREADS']),
+            "upstream_latency_ms": args.latency_ms,
+            "upstream_jitter_ms": args.jitter_ms
+        }})
+        try:
+            report["server_metrics"] = requests.get(f'{args.base_url}/metrics', timeout=5).text
+        except requests.RequestException:
+            pass
+    finally:
+        if process.poll() is None:
+            os.killpg(process.pid, signal.SIGTERM)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+        if log_file is not subprocess.DEVNULL:
+            log_file.close()
+        mock.terminate()
+        mock.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return load.finish(args, report)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
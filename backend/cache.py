@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# etag is an optional fingerprint of value supplied by the caller (used for HTTP validators)
+CacheEntry = namedtuple('CacheEntry', ['value', 'stored_at', 'expires_at', 'etag'], defaults=(None,))
+
+
+def normalize_city(city):
+    # "mumbai", " Mumbai " and "MUMBAI" should all share one cache slot
+    return ' '.join(city.split()).casefold()
+
+
+class TTLCache:
+    # Bounded LRU cache where every entry also expires after `ttl` seconds.
+    # A single lock guards the OrderedDict, so one instance can be shared by all request threads.
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_entry(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry.expires_at <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def peek(self, key):
+        # Like get_entry, but doesn't count as a hit/miss or refresh the LRU position
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or entry.expires_at <= time.time():
+            return None
+        return entry
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return default if entry is None else entry.value
+
+    def set(self, key, value, etag=None):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            self._data[key] = CacheEntry(value, now, now + self.ttl, etag)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
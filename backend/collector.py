@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import os
+import random
+import signal
+import time
+
+import requests
+from dotenv import load_dotenv
+
+# Before the local imports, which read their settings from the environment
+load_dotenv()
+
+import db
+from logging_setup import get_logger
+from migrations import migrate
+from observation_writer import ObservationWriter
+from upstream import current_weather_info, fetch_json
+
+# Polls current weather for a fixed list of cities on a schedule and stores it in current_weather,
+# so the model gets an even time series instead of whatever users happen to look up.
+#
+#   python collector.py                      # run forever with the defaults below
+#   python collector.py --once               # one round for every city, then exit
+#   COLLECTOR_CITIES="Mumbai,Tokyo" python collector.py --interval 300
+#
+# Upstream calls are limited twice: a token bucket keeps the request rate inside the
+# OpenWeatherMap quota, and a semaphore caps how many calls are in flight at once.
+
+log = get_logger('collector')
+
+OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY')
+
+# The cities tracked in notebook/*_current_weather.csv
+DEFAULT_CITIES = ['Mumbai', 'Tokyo', 'Paris', 'New York', 'Sydney', 'Moscow', 'Dubai', 'Toronto', 'Bangkok']
+
+COLLECTOR_CITIES = [city.strip() for city in os.getenv('COLLECTOR_CITIES', ','.join(DEFAULT_CITIES)).split(',') if city.strip()]
+COLLECTOR_INTERVAL = float(os.getenv('COLLECTOR_INTERVAL', '600'))
+COLLECTOR_JITTER = float(os.getenv('COLLECTOR_JITTER', '0.1'))
+COLLECTOR_CONCURRENCY = int(os.getenv('COLLECTOR_CONCURRENCY', '4'))
+# Free OpenWeatherMap plans allow 60 calls per minute
+COLLECTOR_RATE_PER_MINUTE = float(os.getenv('COLLECTOR_RATE_PER_MINUTE', '60'))
+COLLECTOR_BURST = int(os.getenv('COLLECTOR_BURST', '5'))
+# How long to stop calling upstream after a 429 (too many requests)
+RATE_LIMIT_BACKOFF = 60.0
+
+
+class TokenBucket:
+    # Allows `rate` acquisitions per second on average with bursts of up to `capacity`.
+    # Waiters are served in order because the lock is held while waiting for a token.
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds):
+        # Used after a 429: no tokens are handed out until the pause is over
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Collector:
+
+    def __init__(self, cities, interval, jitter, concurrency, rate_per_minute, burst, writer):
+        self.cities = cities
+        self.interval = interval
+        self.jitter = jitter
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.writer = writer
+        self.collected = 0
+        self.failed = 0
+
+    def _next_delay(self):
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    async def collect_city(self, city):
+        params = {"q": city, "appid": OPENWEATHER_API_KEY, "units": "metric"}
+        await self.bucket.acquire()
+        async with self.semaphore:
+            try:
+                # Blocking requests call on a worker thread, through the shared pooled session
+                current_data = await asyncio.to_thread(fetch_json, 'weather', params)
+                weather_info = current_weather_info(current_data)
+            except requests.exceptions.HTTPError as http_err:
+                self.failed += 1
+                if http_err.response is not None and http_err.response.status_code == 429:
+                    log.warning("Rate limited by OpenWeatherMap, pausing for %.0fs", RATE_LIMIT_BACKOFF)
+                    self.bucket.pause(RATE_LIMIT_BACKOFF)
+                else:
+                    log.error("Could not collect weather for %s: %s", city, http_err, extra={"city": city})
+                return
+            except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                self.failed += 1
+                log.error("Could not collect weather for %s: %s", city, e, extra={"city": city})
+                return
+
+        collection_timestamp, collected_at = db.observation_time()
+        if self.writer.submit(db.observation_row(weather_info, collection_timestamp, collected_at)):
+            self.collected += 1
+
+    async def run_city(self, city, stop):
+        # Start times are spread over the first interval, so cities don't all fire at once
+        delay = random.uniform(0, self.interval)
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+            await self.collect_city(city)
+            delay = self._next_delay()
+
+    async def run_once(self):
+        await asyncio.gather(*(self.collect_city(city) for city in self.cities))
+
+    async def run_forever(self):
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                pass
+        log.info("Collecting %d cities every ~%.0fs", len(self.cities), self.interval)
+        await asyncio.gather(*(self.run_city(city, stop) for city in self.cities))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect current weather for a list of cities on a schedule.")
+    parser.add_argument('--cities', default=None, help="Comma-separated city names (default: COLLECTOR_CITIES)")
+    parser.add_argument('--interval', type=float, default=COLLECTOR_INTERVAL, help="Seconds between polls of a city")
+    parser.add_argument('--jitter', type=float, default=COLLECTOR_JITTER, help="Random +/- fraction of the interval")
+    parser.add_argument('--concurrency', type=int, default=COLLECTOR_CONCURRENCY, help="Max upstream calls in flight")
+    parser.add_argument('--rate-per-minute', type=float, default=COLLECTOR_RATE_PER_MINUTE, help="Upstream call quota")
+    parser.add_argument('--burst', type=int, default=COLLECTOR_BURST, help="Token bucket size")
+    parser.add_argument('--once', action='store_true', help="Collect every city once and exit")
+    args = parser.parse_args()
+
+    if not OPENWEATHER_API_KEY:
+        log.warning("OPENWEATHER_API_KEY environment variable not found. Weather API calls will likely fail.")
+    cities = [city.strip() for city in args.cities.split(',') if city.strip()] if args.cities else COLLECTOR_CITIES
+
+    migrate()
+    writer = ObservationWriter(batch_size=len(cities), flush_interval=5.0)
+    collector = Collector(cities, args.interval, args.jitter, args.concurrency, args.rate_per_minute, args.burst, writer)
+    try:
+        asyncio.run(collector.run_once() if args.once else collector.run_forever())
+    finally:
+        writer.close()
+        log.info("Collector stopped: %d observations stored, %d failed", collector.collected, collector.failed,
+                 extra={"writer": writer.stats()})
+
+
+if __name__ == "__main__":
+    main()
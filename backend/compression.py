@@ -0,0 +1,75 @@
+import gzip
+import os
+
+# Response compression negotiated on Accept-Encoding. Text responses (JSON, NDJSON, HTML, CSS, JS)
+# above COMPRESS_MIN_SIZE bytes are sent with brotli when the client accepts it and the brotli
+# module is installed (pip install brotli), otherwise gzip. Smaller bodies are sent as they are,
+# since a few hundred bytes barely shrink. A /weather response is about 900 bytes.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPONSE_COMPRESSION = os.getenv('RESPONSE_COMPRESSION', '1') == '1'
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '500'))
+# Moderate levels: these responses are compressed on every request, not once ahead of time
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', '5'))
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'application/javascript',
+    'text/html', 'text/css', 'text/plain', 'text/javascript'
+}
+
+
+def supported_encodings():
+    # Server preference order, used to break ties between encodings the client rates equally
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def choose_encoding(accept_encodings):
+    # accept_encodings is a parsed Accept-Encoding header (werkzeug Accept); None means send as is
+    return accept_encodings.best_match(supported_encodings())
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def init_compression(app):
+    if not RESPONSE_COMPRESSION:
+        return
+
+    from flask import request
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code in (204, 206)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        # The body depends on Accept-Encoding from here on, whether or not this one is compressed
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+        # Compressed bytes differ from the identity body, so the validator can only be weak. It is
+        # weakened whenever an encoding is negotiated, even for bodies too small to compress, so a
+        # 304 (which has no body to look at) carries the same ETag and Vary as the 200 it replaces.
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        if response.status_code == 304:
+            return response
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -1,31 +1,16 @@
 import sqlite3
 
-DATABASE_NAME = 'weather_data.db'
+from db import DATABASE_NAME, connect
+from migrations import apply_migrations, get_version
 
 def create_table():
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
+        conn = connect()
 
-        # Create table for current weather data
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS current_weather (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                city TEXT NOT NULL,
-                country TEXT,
-                description TEXT,
-                feels_like REAL,
-                humidity INTEGER,
-                icon TEXT,
-                pressure INTEGER,
-                temperature REAL,
-                wind_speed REAL,
-                collection_timestamp TEXT NOT NULL
-            )
-        ''')
-        print(f"Table 'current_weather' created successfully in {DATABASE_NAME}")
-        conn.commit()
+        # Create table for current weather data and bring it up to the latest schema version
+        apply_migrations(conn)
+        print(f"Table 'current_weather' is ready in {DATABASE_NAME} (schema version {get_version(conn)})")
     except sqlite3.Error as e:
         print(f"Error creating table: {e}")
     finally:
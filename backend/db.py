@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DATABASE_NAME = os.getenv('WEATHER_DB_PATH', os.path.join(BASE_DIR, 'weather_data.db'))
+
+# Connection tuning. WAL lets readers and the writer work at the same time across gunicorn
+# workers, synchronous=NORMAL only fsyncs at checkpoints, and busy_timeout makes a worker wait
+# for the write lock instead of failing with "database is locked".
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '5'))
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '8192'))
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+CREATE_CURRENT_WEATHER_TABLE = '''
+    CREATE TABLE IF NOT EXISTS current_weather (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        city TEXT NOT NULL,
+        country TEXT,
+        description TEXT,
+        feels_like REAL,
+        humidity INTEGER,
+        icon TEXT,
+        pressure INTEGER,
+        temperature REAL,
+        wind_speed REAL,
+        collection_timestamp TEXT NOT NULL
+    )
+'''
+
+INSERT_OBSERVATION = '''
+    INSERT INTO current_weather (
+        city, country, description, feels_like, humidity,
+        icon, pressure, temperature, wind_speed, collection_timestamp, collected_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (city, collection_timestamp) DO NOTHING
+'''
+
+# Bulk loads overwrite an existing observation for the same city and timestamp, so re-loading a
+# corrected CSV updates rows instead of duplicating them
+UPSERT_OBSERVATION = '''
+    INSERT INTO current_weather (
+        city, country, description, feels_like, humidity,
+        icon, pressure, temperature, wind_speed, collection_timestamp, collected_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (city, collection_timestamp) DO UPDATE SET
+        country = excluded.country,
+        description = excluded.description,
+        feels_like = excluded.feels_like,
+        humidity = excluded.humidity,
+        icon = excluded.icon,
+        pressure = excluded.pressure,
+        temperature = excluded.temperature,
+        wind_speed = excluded.wind_speed,
+        collected_at = excluded.collected_at
+'''
+
+# Timezone convention: collection_timestamp is the server's local wall-clock time, like the CSV
+# exports and the notebook the model was trained from (hour_of_day is a local hour). collected_at
+# is the same instant as Unix epoch seconds. New observations take it from the clock directly;
+# rows that only have the text (CSV loads, older writers) get it by reading the text as local time.
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_local = threading.local()
+
+
+def connect(path=None):
+    conn = sqlite3.connect(path or DATABASE_NAME, timeout=SQLITE_BUSY_TIMEOUT)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+    conn.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+
+def get_connection():
+    # One connection per thread, opened on first use. The pid check makes sure a worker forked
+    # by gunicorn never reuses a connection that was opened in the master process.
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        conn = connect()
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+
+def close_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+def observation_time():
+    # (collection_timestamp, collected_at) for an observation made now
+    now = time.time()
+    return time.strftime(TIMESTAMP_FORMAT, time.localtime(now)), int(now)
+
+
+def timestamp_to_epoch(collection_timestamp):
+    # Reads the text as local time, same as SQLite's strftime('%s', ..., 'utc') in the migrations.
+    # fromisoformat parses TIMESTAMP_FORMAT strings and is much cheaper than strptime for bulk loads.
+    return int(datetime.fromisoformat(collection_timestamp).timestamp())
+
+
+def observation_row(weather_info, collection_timestamp, collected_at=None):
+    if collected_at is None:
+        collected_at = timestamp_to_epoch(collection_timestamp)
+    return (
+        weather_info['city'], weather_info['country'], weather_info['description'],
+        weather_info['feels_like'], weather_info['humidity'], weather_info['icon'],
+        weather_info['pressure'], weather_info['temperature'], weather_info['wind_speed'],
+        collection_timestamp, collected_at
+    )
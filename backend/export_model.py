@@ -0,0 +1,45 @@
+import argparse
+import json
+import os
+
+import joblib
+
+from linear_model import file_digest
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, 'linear_regression_model.joblib')
+LINEAR_MODEL_PATH = os.path.join(BASE_DIR, 'linear_model.json')
+
+# Writes the coefficients, intercept and feature order of the trained scikit-learn model to a
+# small JSON file, so the app can predict with linear_model.LinearModel without importing sklearn.
+# Run this again every time linear_regression_model.joblib is retrained; until then the app uses the
+# joblib file (MODEL_BACKEND=auto) or warns (MODEL_BACKEND=linear).
+
+def export_model(model_path=MODEL_PATH, output_path=LINEAR_MODEL_PATH):
+    model = joblib.load(model_path)
+    if not hasattr(model, 'feature_names_in_'):
+        raise ValueError("Model has no feature_names_in_. Train it on a DataFrame so the feature order is known.")
+    coef = model.coef_.ravel()
+    features = [str(name) for name in model.feature_names_in_]
+    if len(coef) != len(features):
+        raise ValueError(f"Model has {len(coef)} coefficients but {len(features)} features; only single-output linear models can be exported.")
+
+    data = {
+        "model_type": type(model).__name__,
+        "features": features,
+        "coef": [float(value) for value in coef],
+        "intercept": float(model.intercept_),
+        # Lets the app notice a joblib that was retrained without re-running this script
+        "source_digest": file_digest(model_path)
+    }
+    with open(output_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    print(f"Exported {len(features)} coefficients from {model_path} to {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the trained linear model to a compact JSON file.")
+    parser.add_argument('--model', default=MODEL_PATH, help="Path to the joblib model")
+    parser.add_argument('--output', default=LINEAR_MODEL_PATH, help="Where to write the JSON file")
+    args = parser.parse_args()
+    export_model(args.model, args.output)
@@ -0,0 +1,53 @@
+import threading
+
+import numpy as np
+
+NUMERIC_FEATURES = ('humidity', 'pressure', 'wind_speed', 'hour_of_day', 'day_of_week', 'month')
+CATEGORICAL_FEATURES = ('city', 'country', 'description', 'icon')
+
+
+class FeatureEncoder:
+    # Turns one observation into the model's input row without going through pandas.
+    # Column positions for the numeric features and for every one-hot column ('city_Mumbai',
+    # 'icon_04d', ...) are looked up once here, so encoding is a handful of array writes.
+
+    def __init__(self, features):
+        self.features = list(features)
+        self.n_features = len(self.features)
+        self.numeric_index = np.array([self.features.index(name) for name in NUMERIC_FEATURES])
+        self.category_index = {prefix: {} for prefix in CATEGORICAL_FEATURES}
+        for position, name in enumerate(self.features):
+            if name in NUMERIC_FEATURES:
+                continue
+            prefix, _, value = name.partition('_')
+            if prefix in self.category_index:
+                self.category_index[prefix][value] = position
+        self._local = threading.local()
+
+    def row_buffer(self):
+        # Preallocated (1, n_features) input row, one per thread
+        row = getattr(self._local, 'row', None)
+        if row is None:
+            row = np.zeros((1, self.n_features), dtype=np.float64)
+            self._local.row = row
+        return row
+
+    def encode_into(self, row, numeric_values, categories):
+        # `numeric_values` follows NUMERIC_FEATURES, `categories` maps CATEGORICAL_FEATURES to
+        # their raw values. Returns the (prefix, value) pairs that have no one-hot column.
+        row.fill(0.0)
+        row[self.numeric_index] = numeric_values
+        unknown = []
+        for prefix in CATEGORICAL_FEATURES:
+            value = categories[prefix]
+            position = self.category_index[prefix].get(value)
+            if position is None:
+                unknown.append((prefix, value))
+            else:
+                row[position] = 1.0
+        return unknown
+
+    def encode(self, numeric_values, categories):
+        row = self.row_buffer()
+        unknown = self.encode_into(row[0], numeric_values, categories)
+        return row, unknown
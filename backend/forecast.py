@@ -0,0 +1,105 @@
+from datetime import date
+
+# Daily summary of an OpenWeatherMap 5 day / 3 hour forecast. Items are bucketed by the city's
+# local date (the response's city.timezone offset, in seconds from UTC) rather than the UTC date
+# in dt_txt, and every statistic is updated as items are added, so a forecast is read in one pass.
+#
+#   aggregator = DailyForecastAggregator(forecast_data['city']['timezone'])
+#   aggregator.extend(forecast_data['list'])     # or .add(item) one at a time
+#   aggregator.summary()   # [{"date": "2025-10-09", "temp_max": ..., ...}, ...]
+
+SECONDS_PER_DAY = 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class DayStats:
+    __slots__ = ('date', 'temp_max', 'temp_min', 'temp_sum', 'count', 'pop', 'description', 'icon',
+                 'descriptions', 'icons')
+
+    def __init__(self, iso_date):
+        self.date = iso_date
+        self.temp_max = float('-inf')
+        self.temp_min = float('inf')
+        self.temp_sum = 0.0
+        self.count = 0
+        self.pop = 0.0
+        # Condition of the day's first 3 hour slot, as the summary has always reported it
+        self.description = None
+        self.icon = None
+        # description -> number of 3 hour slots, and the first icon seen with it
+        self.descriptions = {}
+        self.icons = {}
+
+    def add(self, item):
+        main = item["main"]
+        if main["temp_max"] > self.temp_max:
+            self.temp_max = main["temp_max"]
+        if main["temp_min"] < self.temp_min:
+            self.temp_min = main["temp_min"]
+        self.temp_sum += main.get("temp", main["temp_max"])
+        self.count += 1
+        pop = item.get("pop", 0.0)
+        if pop > self.pop:
+            self.pop = pop
+        weather = item["weather"][0]
+        description = weather["description"]
+        if self.description is None:
+            self.description = description
+            self.icon = weather["icon"]
+        if description in self.descriptions:
+            self.descriptions[description] += 1
+        else:
+            self.descriptions[description] = 1
+            self.icons[description] = weather["icon"]
+
+    def dominant_description(self):
+        # Most frequent description of the day; ties go to the one seen first
+        return max(self.descriptions, key=self.descriptions.get) if self.descriptions else None
+
+    def as_dict(self):
+        dominant = self.dominant_description()
+        return {
+            "date": self.date,
+            "temp_max": self.temp_max,
+            "temp_min": self.temp_min,
+            "temp_mean": round(self.temp_sum / self.count, 2),
+            # Highest chance of precipitation of any 3 hour slot of the day, 0-1
+            "pop": self.pop,
+            "description": self.description,
+            "icon": self.icon,
+            "dominant_description": dominant,
+            "dominant_icon": self.icons.get(dominant)
+        }
+
+
+class DailyForecastAggregator:
+
+    def __init__(self, timezone_offset=0):
+        self.timezone_offset = int(timezone_offset or 0)
+        self._days = {}
+
+    def _day(self, local_day):
+        day = self._days.get(local_day)
+        if day is None:
+            # strftime would cost more than the whole day's aggregation
+            day = self._days[local_day] = DayStats(date.fromordinal(EPOCH_ORDINAL + local_day).isoformat())
+        return day
+
+    def add(self, item):
+        self._day((item["dt"] + self.timezone_offset) // SECONDS_PER_DAY).add(item)
+
+    def extend(self, items):
+        for item in items:
+            self.add(item)
+
+    def days(self):
+        return [self._days[local_day] for local_day in sorted(self._days)]
+
+    def summary(self):
+        return [day.as_dict() for day in self.days()]
+
+
+def summarize_forecast(forecast_data):
+    aggregator = DailyForecastAggregator(forecast_data.get("city", {}).get("timezone", 0))
+    aggregator.extend(forecast_data["list"])
+    return aggregator.summary()
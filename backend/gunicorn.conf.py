@@ -0,0 +1,58 @@
+import gc
+import os
+import shutil
+import tempfile
+
+from dotenv import load_dotenv
+
+# Settings in .env apply to the knobs below and, since this runs before the app is imported, to
+# the app as well
+load_dotenv()
+
+# Picked up automatically when gunicorn is started from the backend directory (gunicorn app:app).
+#
+# With preload_app the app module, and with MODEL_LOAD_MODE=eager the prediction model, is loaded
+# once in the master process. Workers are forked from it and share that memory copy-on-write
+# instead of each paying the import and load cost. Set GUNICORN_PRELOAD=0 to load per worker.
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '1'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+
+# Workers share /metrics numbers through snapshot files in this directory (see metrics.py).
+# A new directory per server start, so numbers from a previous run are never mixed in.
+_metrics_dir_created = 'METRICS_DIR' not in os.environ
+if _metrics_dir_created:
+    os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='weather-metrics-')
+
+
+def pre_fork(server, worker):
+    # Objects created during preload are moved out of the GC's generations, so collections in
+    # workers don't touch (and copy) the pages they live on.
+    gc.freeze()
+
+
+def worker_exit(server, worker):
+    # Flush observations that are still queued in the background writer, then write this
+    # worker's final metrics snapshot, continuous profile and any log records still waiting on
+    # the log queue
+    import app
+    import logging_setup
+    import metrics
+    import profiling
+    if app.OBSERVATION_WRITER is not None:
+        app.OBSERVATION_WRITER.close()
+    metrics.registry.flush()
+    profiling.flush_continuous()
+    logging_setup.flush()
+
+
+def child_exit(server, worker):
+    # Runs in the master: keep the exited worker's counters in the /metrics totals
+    import metrics
+    metrics.mark_process_dead(worker.pid, os.environ['METRICS_DIR'])
+
+
+def on_exit(server):
+    if _metrics_dir_created:
+        shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
@@ -0,0 +1,121 @@
+import calendar
+import time
+
+import db
+
+# Read side of current_weather for the /history endpoint. Every query filters on
+# (city COLLATE NOCASE, collected_at) so SQLite can use idx_current_weather_city_nocase_collected_at,
+# and cities match case-insensitively like /weather does. Pages are fetched with keyset (cursor)
+# pagination instead of OFFSET, so page N costs the same as page 1.
+
+RESOLUTIONS = {
+    'raw': None,
+    'hourly': 3600,
+    'daily': 86400
+}
+
+OBSERVATION_COLUMNS = (
+    'id', 'city', 'country', 'description', 'feels_like', 'humidity', 'icon',
+    'pressure', 'temperature', 'wind_speed', 'collection_timestamp', 'collected_at'
+)
+
+AGGREGATE_COLUMNS = (
+    'bucket_start', 'period', 'count', 'temperature_avg', 'temperature_min', 'temperature_max',
+    'feels_like_avg', 'humidity_avg', 'pressure_avg', 'wind_speed_avg'
+)
+
+
+def parse_time(value):
+    # Accepts epoch seconds, 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' (read as UTC, like the hourly and
+    # daily buckets)
+    value = value.strip()
+    if value.lstrip('-').isdigit():
+        return int(value)
+    for fmt in (db.TIMESTAMP_FORMAT, "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            return calendar.timegm(time.strptime(value, fmt))
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid time '{value}'. Use epoch seconds, YYYY-MM-DD or YYYY-MM-DD HH:MM:SS")
+
+
+def _parse_cursor(cursor, parts):
+    try:
+        values = [int(part) for part in cursor.split(':')]
+    except ValueError:
+        values = []
+    if len(values) != parts:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return values
+
+
+def query_observations(conn, city, start, end, limit, cursor=None):
+    sql = f'''
+        SELECT {', '.join(OBSERVATION_COLUMNS)}
+        FROM current_weather
+        WHERE city = ? COLLATE NOCASE AND collected_at >= ? AND collected_at < ?
+    '''
+    params = [city, start, end]
+    if cursor:
+        last_collected_at, last_id = _parse_cursor(cursor, 2)
+        sql += ' AND (collected_at, id) > (?, ?)'
+        params += [last_collected_at, last_id]
+    sql += ' ORDER BY collected_at, id LIMIT ?'
+    params.append(limit + 1)
+
+    rows = conn.execute(sql, params).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1][-1]}:{rows[-1][0]}"
+    return [dict(zip(OBSERVATION_COLUMNS, row)) for row in rows], next_cursor
+
+
+def query_aggregates(conn, city, start, end, bucket_seconds, limit, cursor=None):
+    # Buckets are aligned to UTC hour/day boundaries and computed entirely in SQL.
+    # The cursor is the start of the last bucket returned; the next page starts one bucket later.
+    if cursor:
+        (last_bucket,) = _parse_cursor(cursor, 1)
+        start = max(start, last_bucket + bucket_seconds)
+    period_format = '%Y-%m-%d %H:00:00' if bucket_seconds < 86400 else '%Y-%m-%d'
+    sql = '''
+        SELECT
+            (collected_at / :bucket) * :bucket AS bucket_start,
+            strftime(:period_format, (collected_at / :bucket) * :bucket, 'unixepoch') AS period,
+            COUNT(*),
+            ROUND(AVG(temperature), 2),
+            MIN(temperature),
+            MAX(temperature),
+            ROUND(AVG(feels_like), 2),
+            ROUND(AVG(humidity), 2),
+            ROUND(AVG(pressure), 2),
+            ROUND(AVG(wind_speed), 2)
+        FROM current_weather
+        WHERE city = :city COLLATE NOCASE AND collected_at >= :start AND collected_at < :end
+        GROUP BY bucket_start
+        ORDER BY bucket_start
+        LIMIT :limit
+    '''
+    rows = conn.execute(sql, {
+        'bucket': bucket_seconds,
+        'period_format': period_format,
+        'city': city,
+        'start': start,
+        'end': end,
+        'limit': limit + 1
+    }).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1][0])
+    return [dict(zip(AGGREGATE_COLUMNS, row)) for row in rows], next_cursor
+
+
+def query_history(city, start, end, resolution='raw', limit=100, cursor=None):
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Invalid resolution '{resolution}'. Use one of: {', '.join(RESOLUTIONS)}")
+    conn = db.get_connection()
+    bucket_seconds = RESOLUTIONS[resolution]
+    if bucket_seconds is None:
+        return query_observations(conn, city, start, end, limit, cursor)
+    return query_aggregates(conn, city, start, end, bucket_seconds, limit, cursor)
@@ -0,0 +1,42 @@
+import hashlib
+import json
+
+import numpy as np
+
+
+def file_digest(path):
+    # Identifies the joblib file a linear_model.json was exported from
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def is_exported_from(path, model_path):
+    # True when the LinearModel file at `path` was exported from the joblib file at `model_path` as
+    # it is now. A retrained joblib, or a file exported before the digest was recorded, gives False.
+    with open(path) as f:
+        source_digest = json.load(f).get('source_digest')
+    return source_digest == file_digest(model_path)
+
+
+class LinearModel:
+    # Runtime stand-in for the scikit-learn LinearRegression: prediction is just X @ coef + intercept,
+    # so only NumPy is needed. The file is written by export_model.py.
+
+    def __init__(self, features, coef, intercept):
+        self.feature_names_in_ = np.array(features, dtype=object)
+        self.coef_ = np.asarray(coef, dtype=np.float64)
+        self.intercept_ = float(intercept)
+        if self.coef_.shape != (len(features),):
+            raise ValueError(f"Expected {len(features)} coefficients, got {self.coef_.shape[0]}")
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['features'], data['coef'], data['intercept'])
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.coef_.shape[0]:
+            raise ValueError(f"X has shape {X.shape}, expected (n_rows, {self.coef_.shape[0]})")
+        return X @ self.coef_ + self.intercept_
@@ -1,67 +1,254 @@
+import argparse
+import collections
+import csv
+import glob
+import itertools
 import os
 import sqlite3
-import pandas as pd
-import glob
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-DATABASE_NAME = 'weather_data.db'
+import db
+from migrations import apply_migrations
 
-# Directly paste the EXACT path you copied from Windows File Explorer here.
-# Use a raw string (r"...") to avoid issues with backslashes.
-CSV_FOLDER = r"C:\Saud_khan\notebook" # Example: r"C:\Saud_khan\notebooks"
+DATABASE_NAME = db.DATABASE_NAME
 
-def load_data_from_csv_to_db():
-    conn = None
+# By default pick up the CSVs exported from the notebook; pass other paths/globs on the command line
+DEFAULT_CSV_PATTERN = os.path.join(os.path.dirname(db.BASE_DIR), 'notebook', '*_current_weather.csv')
+DEFAULT_CHUNKSIZE = 5000
+# Files are cut into byte ranges of about this size, and each range is parsed by one worker process
+DEFAULT_SPLIT_BYTES = 4 * 1024 * 1024
+
+CSV_COLUMNS = (
+    'city', 'country', 'description', 'feels_like', 'humidity',
+    'icon', 'pressure', 'temperature', 'wind_speed', 'collection_timestamp'
+)
+
+
+def resolve_csv_files(patterns):
+    # Each pattern can be a file, a directory (all *_current_weather.csv inside it) or a glob
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '*_current_weather.csv')
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        files.extend(os.path.abspath(path) for path in matches if os.path.isfile(path))
+    return list(dict.fromkeys(files))
+
+
+def plan_file(csv_file, split_bytes):
+    # Reads the header and cuts the rest of the file into byte ranges. A line belongs to the
+    # range its first byte falls in, so ranges can be parsed independently.
+    with open(csv_file, 'rb') as f:
+        header_line = f.readline()
+        data_start = f.tell()
+        size = os.fstat(f.fileno()).st_size
+    header = next(csv.reader([header_line.decode('utf-8-sig')]), [])
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
+        positions = [header.index(column) for column in CSV_COLUMNS]
+    except ValueError:
+        raise ValueError(f"{os.path.basename(csv_file)} must have the columns: {', '.join(CSV_COLUMNS)}")
+    ranges = [(start, min(start + split_bytes, size)) for start in range(data_start, size, split_bytes)]
+    return positions, data_start, ranges
+
+
+class MultilineFieldError(ValueError):
+    # A quoted field contains a line break, so the file can't be cut into ranges at line starts
+    pass
 
-        # --- DEBUGGING PRINTS (yeh ab bhi useful hain, rehne do) ---
-        print(f"DEBUG: Calculated CSV_FOLDER path: {CSV_FOLDER}")
-        print(f"DEBUG: Contents of CSV_FOLDER (listing files):")
+
+def parse_records(records, positions):
+    # Returns (rows, skipped) where rows are UPSERT_OBSERVATION tuples built from csv.reader
+    # records. Numeric columns are passed as text and converted by the column affinity of
+    # current_weather.
+    rows = []
+    skipped = 0
+    for line in records:
+        if not line:
+            continue
         try:
-            if not os.path.exists(CSV_FOLDER):
-                print(f"  - Error: CSV_FOLDER '{CSV_FOLDER}' does not exist.")
-            elif not os.path.isdir(CSV_FOLDER):
-                print(f"  - Error: CSV_FOLDER '{CSV_FOLDER}' is not a directory.")
-            else:
-                items = os.listdir(CSV_FOLDER)
-                if not items:
-                    print(f"  - Directory '{CSV_FOLDER}' is empty.")
-                else:
-                    for item in items:
-                        print(f"  - {item}")
-        except Exception as e:
-            print(f"  - An unexpected error occurred while listing directory: {e}")
-        # --- END DEBUGGING PRINTS ---
-
-        csv_files_pattern = os.path.join(CSV_FOLDER, '*_current_weather.csv')
-        print(f"DEBUG: Glob pattern used: {csv_files_pattern}")
-        csv_files = glob.glob(csv_files_pattern)
-
-        if not csv_files:
-            print(f"No *_current_weather.csv files found matching pattern '{csv_files_pattern}'. Please check the path and file names.")
-            return
-
-        print(f"DEBUG: Found CSV files: {csv_files}")
+            values = [line[index] or None for index in positions]
+            values.append(db.timestamp_to_epoch(values[-1]))
+        except (IndexError, TypeError, ValueError):
+            skipped += 1
+            continue
+        rows.append(tuple(values))
+    return rows, skipped
+
+
+def parse_range(csv_file, positions, data_start, start, end):
+    # Runs in a worker process and parses the lines that start in [start, end).
+    # Raises MultilineFieldError when a line has an odd number of quote characters: a quoted field
+    # then continues on the next line, and the range boundaries may fall inside it.
+    with open(csv_file, 'rb') as f:
+        f.seek(start)
+        position = start
+        if start > data_start:
+            # Skip the tail of a line that started in the previous range
+            f.seek(start - 1)
+            if f.read(1) != b'\n':
+                position += len(f.readline())
+        lines = []
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            if line.count(b'"') % 2:
+                raise MultilineFieldError(f"quoted field with a line break near byte {position - len(line)}")
+            lines.append(line.decode('utf-8'))
+    return parse_records(csv.reader(lines), positions)
+
+
+def stream_file(csv_file, positions, chunksize):
+    # Fallback for files parse_range can't split: one csv.reader over the whole file in this
+    # process, yielding (rows, skipped) per chunk of lines
+    with open(csv_file, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        while True:
+            records = list(itertools.islice(reader, chunksize))
+            if not records:
+                return
+            yield parse_records(records, positions)
+
+
+def parse_ranges(executor, workers, csv_file, positions, data_start, ranges):
+    # Yields parse_range results in file order. Ranges are parsed in the worker processes and the
+    # main process is the only writer; at most workers * 2 ranges are submitted or waiting to be
+    # written at a time, so memory stays bounded when SQLite is slower than the parsers.
+    args = ((csv_file, positions, data_start, start, end) for start, end in ranges)
+    if executor is None:
+        for arg in args:
+            yield parse_range(*arg)
+        return
+    pending = collections.deque(executor.submit(parse_range, *arg) for arg in itertools.islice(args, workers * 2))
+    try:
+        while pending:
+            yield pending.popleft().result()
+            # The previous range has been written; start the next one
+            for arg in itertools.islice(args, 1):
+                pending.append(executor.submit(parse_range, *arg))
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def apply_ingest_pragmas(conn, synchronous='OFF'):
+    # Bulk-load settings for this connection only: no fsync per commit and a bigger page cache
+    conn.execute(f'PRAGMA synchronous={synchronous}')
+    conn.execute('PRAGMA cache_size=-65536')
+    conn.execute('PRAGMA temp_store=MEMORY')
+
+
+def already_ingested(conn, csv_file):
+    stat = os.stat(csv_file)
+    row = conn.execute('SELECT size, mtime_ns FROM ingest_manifest WHERE path = ?', (csv_file,)).fetchone()
+    return row is not None and row == (stat.st_size, stat.st_mtime_ns)
+
+
+def record_ingested(conn, csv_file, rows):
+    stat = os.stat(csv_file)
+    with conn:
+        conn.execute('''
+            INSERT INTO ingest_manifest (path, size, mtime_ns, rows, ingested_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (path) DO UPDATE SET
+                size = excluded.size, mtime_ns = excluded.mtime_ns,
+                rows = excluded.rows, ingested_at = excluded.ingested_at
+        ''', (csv_file, stat.st_size, stat.st_mtime_ns, rows, int(time.time())))
+
+
+def write_rows(conn, rows, chunksize):
+    # Single writer: one transaction per chunk, duplicates are resolved by the upsert
+    for offset in range(0, len(rows), chunksize):
+        with conn:
+            conn.executemany(db.UPSERT_OBSERVATION, rows[offset:offset + chunksize])
+
+
+def load_data_from_csv_to_db(patterns=(DEFAULT_CSV_PATTERN,), database=None, chunksize=DEFAULT_CHUNKSIZE,
+                             synchronous='OFF', workers=None, split_bytes=DEFAULT_SPLIT_BYTES, force=False):
+    csv_files = resolve_csv_files(patterns)
+    if not csv_files:
+        print(f"No CSV files found matching {', '.join(patterns)}. Please check the path and file names.")
+        return 0
+
+    workers = workers or os.cpu_count() or 1
+    conn = None
+    executor = None
+    total_rows = 0
+    started = time.perf_counter()
+    try:
+        conn = db.connect(database)
+        apply_migrations(conn)
+        apply_ingest_pragmas(conn, synchronous)
+        rows_before = conn.execute('SELECT COUNT(*) FROM current_weather').fetchone()[0]
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers)
 
         for csv_file in csv_files:
-            print(f"Processing {os.path.basename(csv_file)}...")
-            try:
-                df = pd.read_csv(csv_file)
-                df['collection_timestamp'] = df['collection_timestamp'].astype(str)
-                df.to_sql('current_weather', conn, if_exists='append', index=False)
-                print(f"Successfully loaded data from {os.path.basename(csv_file)}")
-            except Exception as e:
-                print(f"Error loading data from {os.path.basename(csv_file)}: {e}")
+            name = os.path.basename(csv_file)
+            if not force and already_ingested(conn, csv_file):
+                print(f"Skipping {name}, already ingested (use --force to load it again)")
+                continue
 
-        conn.commit()
-        print("\nAll historical CSV data loaded into the database.")
+            print(f"Processing {name}...")
+            file_started = time.perf_counter()
+            file_rows = 0
+            skipped = 0
+            try:
+                positions, data_start, ranges = plan_file(csv_file, split_bytes)
+                try:
+                    for rows, range_skipped in parse_ranges(executor, workers, csv_file, positions, data_start, ranges):
+                        write_rows(conn, rows, chunksize)
+                        file_rows += len(rows)
+                        skipped += range_skipped
+                except MultilineFieldError as e:
+                    # Rows already written are upserted again with the same values
+                    print(f"{name} has a {e}; loading it with a single reader instead")
+                    file_rows = skipped = 0
+                    for rows, chunk_skipped in stream_file(csv_file, positions, chunksize):
+                        write_rows(conn, rows, chunksize)
+                        file_rows += len(rows)
+                        skipped += chunk_skipped
+                # Only recorded once every range is written, so an interrupted file is loaded again next run
+                record_ingested(conn, csv_file, file_rows)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                print(f"Error loading data from {name}: {e}")
+            elapsed = time.perf_counter() - file_started
+            total_rows += file_rows
+            print(f"Loaded {file_rows} rows from {name} in {elapsed:.2f}s "
+                  f"({file_rows / elapsed if elapsed else 0:.0f} rows/sec, {skipped} skipped)")
 
+        rows_after = conn.execute('SELECT COUNT(*) FROM current_weather').fetchone()[0]
+        elapsed = time.perf_counter() - started
+        print(f"\nLoaded {total_rows} rows from {len(csv_files)} files in {elapsed:.2f}s "
+              f"({total_rows / elapsed if elapsed else 0:.0f} rows/sec), "
+              f"{rows_after - rows_before} new, {total_rows - (rows_after - rows_before)} already present.")
     except sqlite3.Error as e:
         print(f"Database error: {e}")
     finally:
+        if executor is not None:
+            executor.shutdown()
         if conn:
             conn.close()
+    return total_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load *_current_weather.csv files into the current_weather table.")
+    parser.add_argument('paths', nargs='*', default=[DEFAULT_CSV_PATTERN],
+                        help="CSV files, directories or glob patterns (default: the notebook CSVs)")
+    parser.add_argument('--db', default=DATABASE_NAME, help="SQLite database to load into")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="Rows per insert transaction")
+    parser.add_argument('--synchronous', default='OFF', choices=['OFF', 'NORMAL', 'FULL'],
+                        help="PRAGMA synchronous used while loading")
+    parser.add_argument('--workers', type=int, default=None, help="Parser processes (default: CPU count, 1 = no pool)")
+    parser.add_argument('--split-bytes', type=int, default=DEFAULT_SPLIT_BYTES, help="Bytes of CSV per parse task")
+    parser.add_argument('--force', action='store_true', help="Load files again even if the manifest says they are done")
+    args = parser.parse_args()
+    load_data_from_csv_to_db(args.paths, args.db, args.chunksize, args.synchronous,
+                             args.workers, args.split_bytes, args.force)
+
 
 if __name__ == "__main__":
-    load_data_from_csv_to_db()
\ No newline at end of file
+    main()
@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+import metrics
+
+# Application logging. Records from every 'weather.*' logger are put on an in-memory queue and
+# written to stderr by a background thread, so a request only pays for building the record, never
+# for the write itself. Output is one JSON object per line (LOG_FORMAT=text for plain lines while
+# developing), with any `extra={...}` fields of the call as keys of their own.
+#
+# Repeated warnings and errors are rate limited: at most LOG_RATE_LIMIT_BURST records with the same
+# message template every LOG_RATE_LIMIT_INTERVAL seconds. The first record after a quiet window
+# carries a "suppressed" count of the records that were dropped in between. Numbers worth keeping
+# in full belong on /metrics, not in the log.
+#
+#   LOG_LEVEL=DEBUG     also log every observation saved by /weather
+#   LOG_RATE_LIMIT_BURST=0   turns rate limiting off
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_RATE_LIMIT_BURST = int(os.getenv('LOG_RATE_LIMIT_BURST', '5'))
+LOG_RATE_LIMIT_INTERVAL = float(os.getenv('LOG_RATE_LIMIT_INTERVAL', '60'))
+
+ROOT_LOGGER = 'weather'
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        suppressed = getattr(record, 'suppressed', None)
+        return f"{line} ({suppressed} similar messages suppressed)" if suppressed else line
+
+
+class RateLimitFilter(logging.Filter):
+    # Lets at most `burst` records per (logger, level, message template) through every `interval`
+    # seconds. Keyed on the template, not the formatted text, so "City '%s' is not a recognized
+    # feature" is one key however many different cities come in; messages that should be limited
+    # separately need templates of their own. Records below `min_level` pass.
+
+    # Templates are a fixed set in practice; the cap only guards against f-string messages
+    MAX_KEYS = 1000
+
+    def __init__(self, burst, interval, min_level=logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.min_level = min_level
+        self.suppressed_total = 0
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.burst <= 0 or record.levelno < self.min_level:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                if window is not None and window[2]:
+                    record.suppressed = window[2]
+                elif window is None and len(self._windows) >= self.MAX_KEYS:
+                    self._windows.clear()
+                # [window start, records let through, records suppressed]
+                window = self._windows[key] = [now, 0, 0]
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.suppressed_total += 1
+            return False
+
+
+class BackgroundQueueHandler(QueueHandler):
+    # QueueHandler that owns its QueueListener. The listener thread is started lazily, like the
+    # observation writer's, so a handler set up before gunicorn forks gets a live thread in each
+    # worker. When the queue is full the record is dropped and counted rather than blocking the
+    # request.
+
+    def __init__(self, target, max_queue=10000):
+        super().__init__(queue.Queue(maxsize=max_queue))
+        self.target = target
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._listener is None or self._pid != os.getpid():
+                if self._pid is not None and self._pid != os.getpid():
+                    self.queue = queue.Queue(maxsize=self.queue.maxsize)
+                self._pid = os.getpid()
+                self._listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+                self._listener.start()
+
+    def prepare(self, record):
+        # Only the %-formatting happens on the calling thread, so mutable arguments are captured as
+        # they are now. The formatter (JSON encoding, tracebacks) runs on the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        # Writes everything queued so far: stops the listener (which drains the queue) and lets
+        # the next record start a new one
+        with self._start_lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+                self._listener = None
+        self.target.flush()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+_handler = None
+_rate_limit = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging():
+    global _handler, _rate_limit
+    with _configure_lock:
+        if _handler is not None:
+            return
+        target = logging.StreamHandler(sys.stderr)
+        target.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+        _rate_limit = RateLimitFilter(LOG_RATE_LIMIT_BURST, LOG_RATE_LIMIT_INTERVAL)
+        _handler = BackgroundQueueHandler(target, LOG_QUEUE_SIZE)
+        # On the handler, so dropped records never reach the queue
+        _handler.addFilter(_rate_limit)
+
+        logger = logging.getLogger(ROOT_LOGGER)
+        logger.setLevel(LOG_LEVEL)
+        logger.addHandler(_handler)
+        # Kept out of the root logger, so gunicorn's and other libraries' logging is left as it is
+        logger.propagate = False
+        metrics.register_collector(collect_metrics)
+
+
+def get_logger(name):
+    configure_logging()
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+
+def flush():
+    # For shutdown hooks (gunicorn worker_exit): write out queued records before the process exits
+    if _handler is not None:
+        _handler.flush()
+
+
+def collect_metrics():
+    if _handler is None:
+        return
+    yield 'counter', 'weather_log_records_dropped_total', {}, _handler.dropped
+    yield 'counter', 'weather_log_records_suppressed_total', {}, _rate_limit.suppressed_total
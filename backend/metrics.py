@@ -0,0 +1,280 @@
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; dead worker files are then just kept
+    fcntl = None
+
+# In-process counters, gauges and histograms, rendered in the Prometheus text format on /metrics.
+#
+# Every gunicorn worker keeps its own numbers. When METRICS_DIR is set (gunicorn.conf.py sets it
+# to a fresh temporary directory), each worker writes a snapshot to <METRICS_DIR>/<pid>.json every
+# METRICS_FLUSH_INTERVAL seconds and /metrics adds up the snapshots of all workers, so a scrape
+# shows the whole server whichever worker answers it. When a worker exits, gunicorn's child_exit
+# hook merges its last snapshot into dead.json, so counters never go backwards on restarts.
+# Without METRICS_DIR, /metrics shows the worker that answered.
+
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+DEAD_WORKERS_FILE = 'dead.json'
+
+# Seconds; from sub-millisecond (feature encoding, model predict) to upstream timeouts
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_SECONDS = 'weather_http_request_duration_seconds'
+STAGE_SECONDS = 'weather_stage_duration_seconds'
+UPSTREAM_ERRORS = 'weather_upstream_errors_total'
+
+HELP = {
+    REQUEST_SECONDS: ('histogram', "Time spent handling a request, by route, method and status"),
+    STAGE_SECONDS: ('histogram', "Time spent in one stage of a request: upstream_current, upstream_forecast, "
+                                 "upstream_group, db_write (one batch with the background writer), "
+                                 "feature_encode, model_predict"),
+    UPSTREAM_ERRORS: ('counter', "Failed OpenWeatherMap calls, by endpoint and reason"),
+    'weather_cache_hits_total': ('counter', "Response cache hits"),
+    'weather_cache_misses_total': ('counter', "Response cache misses"),
+    'weather_cache_evictions_total': ('counter', "Response cache entries evicted to make room"),
+    'weather_cache_entries': ('gauge', "Entries in the response cache"),
+    'weather_cache_hit_ratio': ('gauge', "Response cache hits / lookups since the workers started"),
+    'weather_single_flight_shared_total': ('counter', "Requests that shared another request's upstream fetch"),
+    'weather_observations_written_total': ('counter', "Observations written by the background writer"),
+    'weather_observations_dropped_total': ('counter', "Observations dropped because the writer queue was full"),
+    'weather_observation_queue_depth': ('gauge', "Observations waiting in the writer queue"),
+    'weather_unknown_features_total': ('counter', "Prediction inputs whose city, country, description or icon "
+                                                  "the model does not know, by feature"),
+    'weather_log_records_dropped_total': ('counter', "Log records dropped because the log queue was full"),
+    'weather_log_records_suppressed_total': ('counter', "Repeated warnings and errors held back by log rate limiting"),
+}
+
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        self._flusher = None
+        self._flusher_pid = None
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self._ensure_flusher()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(BUCKETS, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # per-bucket counts (the last one is +Inf), sum, count
+                histogram = self._histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+        self._ensure_flusher()
+
+    def register_collector(self, collect):
+        # `collect()` is called for every snapshot and returns (type, name, labels, value) tuples,
+        # for numbers that are kept elsewhere (cache and writer statistics)
+        self._collectors.append(collect)
+
+    def snapshot(self):
+        with self._lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self._counters.items()]
+            histograms = [[name, list(labels), list(h[0]), h[1], h[2]] for (name, labels), h in self._histograms.items()]
+        gauges = []
+        for collect in self._collectors:
+            for kind, name, labels, value in collect():
+                entry = [name, sorted(labels.items()), value]
+                (counters if kind == 'counter' else gauges).append(entry)
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+    # ----- cross-worker files -----
+
+    def _ensure_flusher(self):
+        if not METRICS_DIR or (self._flusher is not None and self._flusher_pid == os.getpid()):
+            return
+        with self._lock:
+            if self._flusher is None or self._flusher_pid != os.getpid():
+                self._flusher_pid = os.getpid()
+                self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        if not METRICS_DIR:
+            return
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f'{os.getpid()}.json')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def server_snapshots(self):
+        # This worker's live numbers plus the last snapshot of every other (and every dead) worker
+        snapshots = [self.snapshot()]
+        if METRICS_DIR:
+            own_file = f'{os.getpid()}.json'
+            for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+                if os.path.basename(path) == own_file:
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return snapshots
+
+
+def merge(snapshots):
+    counters, gauges, histograms = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get("counters", []):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snapshot.get("gauges", []):
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0) + value
+        for name, labels, buckets, total, count in snapshot.get("histograms", []):
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = [list(buckets), total, count]
+            else:
+                merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+                merged[1] += total
+                merged[2] += count
+    return counters, gauges, histograms
+
+
+def mark_process_dead(pid, directory=METRICS_DIR):
+    # Called from gunicorn's child_exit hook in the master: folds the dead worker's counters and
+    # histograms into dead.json (gauges describe live state, so they are dropped)
+    if not directory:
+        return
+    path = os.path.join(directory, f'{pid}.json')
+    if not os.path.exists(path) or fcntl is None:
+        return
+    dead_path = os.path.join(directory, DEAD_WORKERS_FILE)
+    with open(os.path.join(directory, 'dead.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            snapshots = []
+            for snapshot_path in (dead_path, path):
+                try:
+                    with open(snapshot_path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    pass
+            counters, _, histograms = merge(snapshots)
+            merged = {
+                "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+                "histograms": [[name, list(labels), h[0], h[1], h[2]] for (name, labels), h in histograms.items()]
+            }
+            with open(dead_path + '.tmp', 'w') as f:
+                json.dump(merged, f)
+            os.replace(dead_path + '.tmp', dead_path)
+            os.remove(path)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshots):
+    counters, gauges, histograms = merge(snapshots)
+
+    # Derived from the server-wide totals, so it is the ratio across all workers
+    for cache in {dict(labels).get('cache') for name, labels in counters if name == 'weather_cache_hits_total'}:
+        labels = (('cache', cache),)
+        hits = counters.get(('weather_cache_hits_total', labels), 0)
+        lookups = hits + counters.get(('weather_cache_misses_total', labels), 0)
+        gauges[('weather_cache_hit_ratio', labels)] = round(hits / lookups, 4) if lookups else 0.0
+
+    series = {}
+    for values in (counters, gauges):
+        for (name, labels), value in values.items():
+            series.setdefault(name, []).append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    for (name, labels), (buckets, total, count) in histograms.items():
+        lines = series.setdefault(name, [])
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS + (float('inf'),), buckets):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{name}_bucket{_format_labels(labels, ("le", le))} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+        lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+    output = []
+    for name in sorted(series):
+        kind, help_text = HELP.get(name, ('untyped', name))
+        output.append(f'# HELP {name} {help_text}')
+        output.append(f'# TYPE {name} {kind}')
+        output.extend(series[name])
+    return '\n'.join(output) + '\n'
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+register_collector = registry.register_collector
+
+
+def observe_stage(stage, seconds):
+    observe(STAGE_SECONDS, seconds, stage=stage)
+
+
+@contextmanager
+def timed(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def render_server():
+    return render(registry.server_snapshots())
+
+
+def init_metrics(app):
+    # Times every Flask request. Routes are labelled by their rule ('/weather', not the full URL)
+    # so the number of series stays bounded.
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            observe(REQUEST_SECONDS, time.perf_counter() - started,
+                    route=route, method=request.method, status=str(response.status_code))
+        return response
@@ -0,0 +1,168 @@
+import sqlite3
+
+import db
+from logging_setup import get_logger
+
+# Versioned schema migrations for weather_data.db. The applied version is stored in
+# PRAGMA user_version. Each migration runs inside BEGIN IMMEDIATE, so when several gunicorn
+# workers start at once only one of them applies it and the others see the new version.
+# Migrations must stay safe to re-run: they can be applied to databases that were created
+# before this file existed (user_version 0 but the table already there).
+
+log = get_logger('migrations')
+
+
+def _column_names(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def _create_current_weather(conn):
+    conn.execute(db.CREATE_CURRENT_WEATHER_TABLE)
+
+
+def _add_epoch_timestamps(conn):
+    # collection_timestamp stays as TEXT for the CSV exports and the notebook; collected_at holds
+    # the same instant as integer epoch seconds and is what the (city, collected_at) index and
+    # time-range queries use. This backfill and trigger read the text as UTC, but the text is local
+    # time (see db.TIMESTAMP_FORMAT); migration 5 corrects that.
+    if 'collected_at' not in _column_names(conn, 'current_weather'):
+        conn.execute('ALTER TABLE current_weather ADD COLUMN collected_at INTEGER')
+    conn.execute('''
+        UPDATE current_weather
+        SET collected_at = CAST(strftime('%s', collection_timestamp) AS INTEGER)
+        WHERE collected_at IS NULL
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_current_weather_city_collected_at
+        ON current_weather (city, collected_at)
+    ''')
+    # Writers that only know about collection_timestamp (older scripts, pandas to_sql) still get
+    # collected_at filled in
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_current_weather_collected_at
+        AFTER INSERT ON current_weather
+        WHEN NEW.collected_at IS NULL
+        BEGIN
+            UPDATE current_weather
+            SET collected_at = CAST(strftime('%s', NEW.collection_timestamp) AS INTEGER)
+            WHERE id = NEW.id;
+        END
+    ''')
+
+
+def _unique_observations_and_manifest(conn):
+    # One row per (city, collection_timestamp): existing duplicates (e.g. from loading the same CSV
+    # twice) are removed, keeping the first copy, so the unique index can be created. Writers use
+    # INSERT ... ON CONFLICT against this index, which makes re-running an ingest safe.
+    conn.execute('''
+        DELETE FROM current_weather
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM current_weather GROUP BY city, collection_timestamp
+        )
+    ''')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_current_weather_city_timestamp
+        ON current_weather (city, collection_timestamp)
+    ''')
+    # Files already loaded by load_csv_to_db.py, so an interrupted bulk load can resume
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_manifest (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            rows INTEGER NOT NULL,
+            ingested_at INTEGER NOT NULL
+        )
+    ''')
+
+
+def _city_nocase_index(conn):
+    # /history matches cities case-insensitively, like /weather, so 'london' finds rows stored as
+    # 'London'. The exact (city, collected_at) index stays for archive.py, which walks the stored names.
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_current_weather_city_nocase_collected_at
+        ON current_weather (city COLLATE NOCASE, collected_at)
+    ''')
+
+
+def _local_epoch_timestamps(conn):
+    # collection_timestamp is local wall-clock time, so collected_at is re-derived with the 'utc'
+    # modifier, which reads the text as local time like db.timestamp_to_epoch. Rows whose
+    # collected_at came from the clock get the same value back (except in the repeated hour when
+    # daylight saving time ends, where the text alone is ambiguous).
+    conn.execute('''
+        UPDATE current_weather
+        SET collected_at = CAST(strftime('%s', collection_timestamp, 'utc') AS INTEGER)
+    ''')
+    conn.execute('DROP TRIGGER IF EXISTS trg_current_weather_collected_at')
+    conn.execute('''
+        CREATE TRIGGER trg_current_weather_collected_at
+        AFTER INSERT ON current_weather
+        WHEN NEW.collected_at IS NULL
+        BEGIN
+            UPDATE current_weather
+            SET collected_at = CAST(strftime('%s', NEW.collection_timestamp, 'utc') AS INTEGER)
+            WHERE id = NEW.id;
+        END
+    ''')
+
+
+MIGRATIONS = [
+    (1, 'create current_weather table', _create_current_weather),
+    (2, 'epoch collected_at column and (city, collected_at) index', _add_epoch_timestamps),
+    (3, 'unique (city, collection_timestamp) and ingest manifest', _unique_observations_and_manifest),
+    (4, 'case-insensitive (city, collected_at) index', _city_nocase_index),
+    (5, 'read collection_timestamp as local time for collected_at', _local_epoch_timestamps),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def apply_migrations(conn):
+    # Returns the list of versions that were applied by this call
+    applied = []
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # transactions are managed explicitly below
+    try:
+        for version, description, migrate in MIGRATIONS:
+            if get_version(conn) >= version:
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Another worker may have applied it while we waited for the write lock
+                if get_version(conn) >= version:
+                    conn.execute('ROLLBACK')
+                    continue
+                migrate(conn)
+                conn.execute(f'PRAGMA user_version = {version}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            log.info("Applied database migration %d: %s", version, description)
+            applied.append(version)
+    finally:
+        conn.isolation_level = isolation_level
+    return applied
+
+
+def migrate(path=None):
+    conn = db.connect(path)
+    try:
+        return apply_migrations(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    try:
+        migrate()
+        conn = db.connect()
+        log.info("%s is at schema version %d (latest %d)", db.DATABASE_NAME, get_version(conn), LATEST_VERSION)
+        conn.close()
+    except sqlite3.Error as e:
+        log.error("Database migration failed: %s", e)
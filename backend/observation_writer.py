@@ -0,0 +1,166 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import db
+import metrics
+from logging_setup import get_logger
+
+log = get_logger('observation_writer')
+
+_STOP = object()
+
+OVERFLOW_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+
+class ObservationWriter:
+    # Queues current_weather rows and writes them from a background thread, one transaction
+    # per batch. A batch is flushed when it reaches `batch_size` rows or when `flush_interval`
+    # seconds have passed since its first row, whichever comes first.
+    #
+    # When the queue is full, `overflow` decides what happens to a new row:
+    #   drop_newest - reject the new row (request path never waits)
+    #   drop_oldest - throw away the oldest queued row to make room
+    #   block       - wait up to `block_timeout` seconds for space, then reject
+
+    def __init__(self, path=None, batch_size=100, flush_interval=1.0, max_queue=10000,
+                 overflow='drop_newest', block_timeout=0.5):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got '{overflow}'")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed_batches = 0
+
+    def _ensure_started(self):
+        # Started lazily so that a writer created before gunicorn forks gets its own thread
+        # in each worker instead of a dead one inherited from the master.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='observation-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, row):
+        if self._closed:
+            return False
+        self._ensure_started()
+        try:
+            if self.overflow == 'block':
+                self._queue.put(row, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            if self.overflow != 'drop_oldest':
+                self.dropped += 1
+                return False
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                self.dropped += 1
+                return False
+        self.enqueued += 1
+        return True
+
+    def close(self, timeout=5.0):
+        # Stops accepting rows, writes whatever is still queued and waits for the thread to finish
+        self._closed = True
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            log.warning("Observation writer queue is still full at shutdown; some rows may be lost.")
+            return
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches
+        }
+
+    def _write(self, conn, batch):
+        try:
+            with metrics.timed('db_write'), conn:
+                conn.executemany(db.INSERT_OBSERVATION, batch)
+            self.written += len(batch)
+        except sqlite3.Error as e:
+            self.failed_batches += 1
+            log.error("Could not write batch of %d observations to database. SQLite Error: %s", len(batch), e)
+
+    def _run(self):
+        conn = db.connect(self.path)
+        stopping = False
+        try:
+            while not stopping:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._write(conn, batch)
+
+            # Drain anything that was queued before the stop marker
+            batch = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    batch.append(item)
+            if batch:
+                self._write(conn, batch)
+        finally:
+            conn.close()
+
+
+def create_writer_from_env():
+    if os.getenv('ASYNC_DB_WRITES', '1') != '1':
+        return None
+    writer = ObservationWriter(
+        batch_size=int(os.getenv('DB_WRITE_BATCH_SIZE', '100')),
+        flush_interval=float(os.getenv('DB_WRITE_FLUSH_INTERVAL', '1.0')),
+        max_queue=int(os.getenv('DB_WRITE_QUEUE_SIZE', '10000')),
+        overflow=os.getenv('DB_WRITE_OVERFLOW', 'drop_newest')
+    )
+    atexit.register(writer.close)
+    return writer
@@ -0,0 +1,304 @@
+import cProfile
+import glob
+import hmac
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs
+
+from logging_setup import get_logger
+
+# Opt-in profiling of production-shaped requests, off unless PROFILING=1 and PROFILING_TOKEN is set.
+#
+# Per request: send `X-Profile: sample` (or `?_profile=sample`) and the request runs under a
+# profiler. The response gets an X-Profile header with the URL of the result under
+# /debug/profiles/. Modes:
+#   sample   - wall-clock stack sampling of the request thread every PROFILE_SAMPLE_INTERVAL
+#              seconds. Output is collapsed stacks (flamegraph.pl, speedscope, inferno), and
+#              time spent waiting on upstream calls or locks shows up too.
+#   cprofile - deterministic cProfile of the request thread, saved as a .prof file (snakeviz,
+#              pstats). Better for requests of a few milliseconds, which get only a handful of
+#              samples; adds overhead to every Python call.
+# `X-Profile: 1` uses PROFILE_MODE. The request must also carry PROFILING_TOKEN as
+# `X-Profile-Token` (or ?_profile_token), otherwise the flag is ignored. Without PROFILING_TOKEN
+# the flag is always ignored and the /debug/profiles routes are not registered: profiles show
+# source paths and where the time goes, and the flag lets anyone slow requests down.
+#
+# Continuous: PROFILING_CONTINUOUS=1 samples every thread of each worker every
+# PROFILE_CONTINUOUS_INTERVAL seconds (100 Hz by default, well under 1% CPU) and writes the
+# accumulated collapsed stacks to <PROFILE_DIR>/continuous-<pid>.collapsed every
+# PROFILE_FLUSH_INTERVAL seconds. Stacks start with the thread name. Threads that are idle still
+# get samples, in whatever they are blocked on (queue.get, select); filter them in the viewer.
+# Without PROFILING_TOKEN the files are only readable on the host.
+
+log = get_logger('profiling')
+
+PROFILING = os.getenv('PROFILING', '0') == '1'
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN')
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'sample')
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'weather-profiles'))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.001'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '200'))
+PROFILING_CONTINUOUS = os.getenv('PROFILING_CONTINUOUS', '0') == '1'
+PROFILE_CONTINUOUS_INTERVAL = float(os.getenv('PROFILE_CONTINUOUS_INTERVAL', '0.01'))
+PROFILE_FLUSH_INTERVAL = float(os.getenv('PROFILE_FLUSH_INTERVAL', '60'))
+
+MODES = ('sample', 'cprofile')
+EXTENSIONS = {'sample': 'collapsed', 'cprofile': 'prof'}
+
+
+# Frame labels per code object; building the string is most of the cost of a sample
+_labels = {}
+
+
+def _frame_label(code):
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+class StackSampler:
+    # Samples the Python stacks of `thread_ids` (all threads but its own when None) from a
+    # background thread and counts identical stacks, in the collapsed format flame graph tools read:
+    # "outer;inner;innermost <count>" per line.
+
+    def __init__(self, interval, thread_ids=None, thread_names=False, on_tick=None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.thread_names = thread_names
+        self.on_tick = on_tick
+        self.counts = {}
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+            if self.on_tick is not None:
+                self.on_tick()
+
+    def sample(self):
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()} if self.thread_names else None
+        stacks = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if names is not None:
+                stack.append(names.get(thread_id, f'thread-{thread_id}'))
+            stacks.append(';'.join(reversed(stack)))
+        with self._lock:
+            for stack in stacks:
+                self.counts[stack] = self.counts.get(stack, 0) + 1
+            self.samples += 1
+
+    def collapsed(self):
+        with self._lock:
+            return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.counts.items()))
+
+
+def _write_text(text):
+    def write(path):
+        with open(path, 'w') as f:
+            f.write(text)
+    return write
+
+
+def _save(name, write):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, name)
+    tmp_path = f'{path}.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _prune():
+    # Keeps the newest PROFILE_MAX_FILES per-request profiles
+    paths = [path for path in glob.glob(os.path.join(PROFILE_DIR, '*.*'))
+             if not os.path.basename(path).startswith('continuous-') and not path.endswith('.tmp')]
+    if len(paths) <= PROFILE_MAX_FILES:
+        return
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:len(paths) - PROFILE_MAX_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class RequestProfile:
+    # Profiles the calling thread between start() and stop(); stop() saves the result and
+    # returns the file name
+
+    def __init__(self, mode, label):
+        self.mode = mode
+        self.label = label
+        self._profiler = None
+
+    def start(self):
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler = StackSampler(PROFILE_SAMPLE_INTERVAL, thread_ids={threading.get_ident()}).start()
+        self.started = time.perf_counter()
+        return self
+
+    def stop(self):
+        elapsed_ms = (time.perf_counter() - self.started) * 1000
+        if self.mode == 'cprofile':
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', self.label).strip('_') or 'root'
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{slug}-{elapsed_ms:.0f}ms.{EXTENSIONS[self.mode]}"
+        if self.mode == 'cprofile':
+            _save(name, self._profiler.dump_stats)
+        else:
+            _save(name, _write_text(self._profiler.collapsed()))
+        _prune()
+        return name
+
+
+def _query_value(environ, name):
+    query = environ.get('QUERY_STRING', '')
+    return parse_qs(query).get(name, [None])[0] if name in query else None
+
+
+def has_token(environ):
+    if not PROFILING_TOKEN:
+        return False
+    token = environ.get('HTTP_X_PROFILE_TOKEN') or _query_value(environ, '_profile_token') or ''
+    return hmac.compare_digest(token.encode(), PROFILING_TOKEN.encode())
+
+
+def requested_mode(environ):
+    # The profiling mode asked for by a request (header or query flag), or None
+    if not PROFILING:
+        return None
+    mode = environ.get('HTTP_X_PROFILE') or _query_value(environ, '_profile')
+    if not mode or mode == '0' or not has_token(environ):
+        return None
+    if mode in ('1', 'true'):
+        return PROFILE_MODE
+    return mode if mode in MODES else None
+
+
+class ProfilingMiddleware:
+    # WSGI middleware, so before/after_request hooks and response compression are profiled along
+    # with the view
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        ensure_continuous()
+        mode = requested_mode(environ)
+        if mode is None:
+            return self.wsgi_app(environ, start_response)
+
+        response = {}
+        chunks = []
+
+        def capture_start_response(status, headers, exc_info=None):
+            response.update(status=status, headers=headers, exc_info=exc_info)
+            return chunks.append
+
+        profile = RequestProfile(mode, environ.get('PATH_INFO', '')).start()
+        try:
+            body = self.wsgi_app(environ, capture_start_response)
+            try:
+                chunks.extend(body)
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+        finally:
+            name = profile.stop()
+        headers = list(response['headers']) + [('X-Profile', f'/debug/profiles/{name}')]
+        start_response(response['status'], headers, response['exc_info'])
+        return chunks
+
+
+# ----- continuous sampling -----
+
+_continuous = None
+_continuous_pid = None
+_continuous_lock = threading.Lock()
+_last_flush = 0.0
+
+
+def ensure_continuous():
+    # Started lazily per process, so each forked gunicorn worker samples itself
+    global _continuous, _continuous_pid, _last_flush
+    if not PROFILING_CONTINUOUS or _continuous_pid == os.getpid():
+        return
+    with _continuous_lock:
+        if _continuous_pid != os.getpid():
+            _continuous_pid = os.getpid()
+            _last_flush = time.monotonic()
+            _continuous = StackSampler(PROFILE_CONTINUOUS_INTERVAL, thread_names=True,
+                                       on_tick=_maybe_flush_continuous).start()
+
+
+def _maybe_flush_continuous():
+    if time.monotonic() - _last_flush >= PROFILE_FLUSH_INTERVAL:
+        flush_continuous()
+
+
+def flush_continuous():
+    global _last_flush
+    if _continuous is None or _continuous_pid != os.getpid():
+        return
+    _last_flush = time.monotonic()
+    _save(f'continuous-{os.getpid()}.collapsed', _write_text(_continuous.collapsed()))
+
+
+def init_profiling(app):
+    if not (PROFILING or PROFILING_CONTINUOUS):
+        return
+
+    from flask import abort, jsonify, request, send_from_directory
+
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app)
+
+    if not PROFILING_TOKEN:
+        if PROFILING:
+            log.warning("PROFILING=1 but PROFILING_TOKEN is not set; X-Profile is ignored and /debug/profiles is off.")
+        return
+
+    # Same token as the profiling flag
+    @app.route('/debug/profiles')
+    def list_profiles():
+        if not has_token(request.environ):
+            abort(404)
+        if not os.path.isdir(PROFILE_DIR):
+            return jsonify([])
+        names = sorted(os.listdir(PROFILE_DIR), reverse=True)
+        return jsonify([f'/debug/profiles/{name}' for name in names if not name.endswith('.tmp')])
+
+    @app.route('/debug/profiles/<name>')
+    def get_profile(name):
+        if name.endswith('.tmp') or not has_token(request.environ):
+            abort(404)
+        return send_from_directory(PROFILE_DIR, name, mimetype='text/plain' if name.endswith('.collapsed') else None)
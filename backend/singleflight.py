@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; the cross-worker mode is then disabled
+    fcntl = None
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # Coalesces concurrent calls for the same key inside one process: the first caller (the
+    # leader) runs the function and every caller that arrives while it is running waits for and
+    # shares its result or exception. `do` returns (result, shared).
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self):
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    # asyncio version of SingleFlight for the ASGI app (one event loop per worker). The leader's
+    # coroutine runs as a task that followers await; the task is shielded, so a caller that goes
+    # away (client disconnect) doesn't cancel the fetch for everyone else. `do` takes a function
+    # returning a coroutine and returns (result, shared).
+
+    def __init__(self):
+        self._tasks = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key, fn):
+        task = self._tasks.get(key)
+        if task is not None:
+            self.shared += 1
+            return await asyncio.shield(task), True
+
+        self.leaders += 1
+        task = asyncio.ensure_future(fn())
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return await asyncio.shield(task), False
+
+    def stats(self):
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._tasks)}
+
+
+class FileFlight:
+    # Cross-process version for gunicorn workers on one machine. The leader of each worker takes
+    # an exclusive flock on a lock file for the key; if another worker wrote a result for the key
+    # less than `share_ttl` seconds ago it is read from <key hash>.json instead of calling `fn`
+    # again. Results must be JSON-serializable. `do` returns (result, shared).
+    #
+    # Keys come from user input (city names), so nothing in the directory is created per key and
+    # kept: keys share `lock_stripes` lock files (unrelated keys that land on the same stripe only
+    # wait for each other), result files are only written for calls that succeeded, and result
+    # files older than `share_ttl` are swept.
+
+    def __init__(self, directory, share_ttl, lock_stripes=256):
+        if fcntl is None:
+            raise RuntimeError("Cross-worker single-flight needs fcntl (POSIX only)")
+        self.directory = directory
+        self.share_ttl = share_ttl
+        self.lock_stripes = lock_stripes
+        self._next_sweep = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, key):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        stripe = int(name[:8], 16) % self.lock_stripes
+        return os.path.join(self.directory, f'stripe-{stripe}.lock'), os.path.join(self.directory, name + '.json')
+
+    def _read_fresh(self, result_path):
+        try:
+            with open(result_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - data.get('stored_at', 0) > self.share_ttl:
+            return None
+        return data
+
+    def sweep(self):
+        # Removes result files (and temp files left by a crash) that are too old to be shared.
+        # Runs at most once per share_ttl in each process.
+        now = time.time()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.share_ttl
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(('.json', '.tmp')):
+                continue
+            try:
+                if now - entry.stat().st_mtime > self.share_ttl:
+                    os.remove(entry.path)
+            except OSError:
+                pass  # already removed by another worker
+
+    def do(self, key, fn):
+        lock_path, result_path = self._paths(key)
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                data = self._read_fresh(result_path)
+                if data is not None:
+                    return data['result'], True
+                result = fn()
+                tmp_path = f"{result_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump({'stored_at': time.time(), 'result': result}, f)
+                os.replace(tmp_path, result_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self.sweep()
+        return result, False
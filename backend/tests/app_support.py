@@ -0,0 +1,22 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+import db
+
+# Imports app.py for endpoint tests. The app migrates its database at import time, so it is
+# pointed at a throwaway file instead of the committed weather_data.db, and observations are
+# written inline so tests don't race a background writer.
+_directory = tempfile.mkdtemp(prefix='weather-tests-')
+atexit.register(shutil.rmtree, _directory, True)
+db.DATABASE_NAME = os.path.join(_directory, 'weather_data.db')
+os.environ['ASYNC_DB_WRITES'] = '0'
+
+import app  # noqa: E402
+
+app.app.testing = True
+
+
+def client():
+    return app.app.test_client()
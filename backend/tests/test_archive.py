@@ -0,0 +1,57 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+import db
+from archive import export_archive, pa, read_archive
+from migrations import migrate
+
+# 2024-01-31 23:00 and 2024-02-01 01:00 UTC, then a row from now
+JANUARY, FEBRUARY = 1706742000, 1706749200
+
+
+@unittest.skipIf(pa is None, "needs pyarrow")
+class ExportArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = os.path.join(directory.name, 'archive')
+        self.database = os.path.join(directory.name, 'weather_data.db')
+        migrate(self.database)
+        conn = sqlite3.connect(self.database)
+        for city, collected_at in (('London', JANUARY), ('London', FEBRUARY), ('Paris', FEBRUARY),
+                                   ('London', int(time.time()))):
+            timestamp = time.strftime(db.TIMESTAMP_FORMAT, time.localtime(collected_at))
+            conn.execute(db.INSERT_OBSERVATION, (city, 'GB', 'mist', 5.0, 80, '50n', 1000, 6.0, 3.0, timestamp, collected_at))
+        conn.commit()
+        conn.close()
+
+    def live_rows(self):
+        conn = sqlite3.connect(self.database)
+        try:
+            return conn.execute('SELECT city, collected_at FROM current_weather ORDER BY collected_at').fetchall()
+        finally:
+            conn.close()
+
+    def test_prune_only_deletes_rows_before_the_cutoff(self):
+        self.assertEqual(export_archive(self.root, self.database, before=FEBRUARY + 1, prune=True), 3)
+        self.assertEqual([city for city, _ in self.live_rows()], ['London'])
+        table = read_archive(self.root, city='London')
+        self.assertEqual(sorted(table['month'].to_pylist()), ['2024-01', '2024-02'])
+        self.assertEqual(read_archive(self.root).num_rows, 3)
+
+    def test_prune_without_cutoff_is_refused(self):
+        with self.assertRaises(ValueError):
+            export_archive(self.root, self.database, prune=True)
+        self.assertEqual(len(self.live_rows()), 4)
+
+    def test_export_without_prune_keeps_every_row(self):
+        self.assertEqual(export_archive(self.root, self.database), 4)
+        self.assertEqual(len(self.live_rows()), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from unittest import mock
+
+from cache import TTLCache, normalize_city
+
+
+class TTLCacheTest(unittest.TestCase):
+
+    def test_entries_expire_after_ttl(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        with mock.patch('cache.time.time', return_value=1000.0):
+            cache.set('london', {"temp": 21}, etag='"abc"')
+        with mock.patch('cache.time.time', return_value=1059.0):
+            entry = cache.get_entry('london')
+            self.assertEqual((entry.value, entry.stored_at, entry.expires_at, entry.etag),
+                             ({"temp": 21}, 1000.0, 1060.0, '"abc"'))
+        with mock.patch('cache.time.time', return_value=1060.0):
+            self.assertIsNone(cache.peek('london'))
+            self.assertEqual(cache.get('london', 'missing'), 'missing')
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_peek_does_not_count_or_refresh(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.peek('a').value, 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.peek('a'))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (0, 0))
+
+    def test_stats(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set('a', 1)
+        cache.get('a')
+        cache.get('a')
+        cache.get('b')
+        self.assertEqual(cache.stats(), {"size": 1, "maxsize": 10, "ttl": 60, "hits": 2, "misses": 1,
+                                         "evictions": 0, "hit_ratio": 0.6667})
+
+    def test_zero_size_or_ttl_disables_caching(self):
+        for cache in (TTLCache(maxsize=0, ttl=60), TTLCache(maxsize=10, ttl=0)):
+            cache.set('a', 1)
+            self.assertIsNone(cache.get('a'))
+
+    def test_normalize_city(self):
+        self.assertEqual({normalize_city(city) for city in ('mumbai', ' Mumbai ', 'MUMBAI')}, {'mumbai'})
+        self.assertEqual(normalize_city('  New   York '), 'new york')
+
+
+if __name__ == '__main__':
+    unittest.main()
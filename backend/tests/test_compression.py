@@ -0,0 +1,137 @@
+import gzip
+import unittest
+from unittest import mock
+
+from werkzeug.http import parse_accept_header
+
+import compression
+import upstream
+from bench.mock_openweather import MockOpenWeather, serve
+from cache import TTLCache
+from tests.app_support import app, client
+
+try:
+    from starlette.testclient import TestClient
+
+    import asgi
+except ImportError:  # pip install -r requirements-asgi.txt
+    asgi = None
+
+OBSERVATION = {"city": "Mumbai", "humidity": 70, "pressure": 1008, "wind_speed": 4.1,
+               "description": "mist", "icon": "50n", "country_code": "IN"}
+
+
+class CompressionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = client()
+
+    def test_large_json_is_gzipped(self):
+        rows = [OBSERVATION] * 50
+        identity = self.client.post('/predict_temperature/batch', json=rows)
+        compressed = self.client.post('/predict_temperature/batch', json=rows, headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', identity.headers)
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.get_data()), identity.get_data())
+        self.assertEqual(compressed.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(identity.headers['Vary'], 'Accept-Encoding')
+
+    @unittest.skipIf(compression.brotli is None, "needs brotli")
+    def test_brotli_is_preferred_when_accepted(self):
+        response = self.client.post('/predict_temperature/batch', json=[OBSERVATION] * 50,
+                                    headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+
+    def test_small_bodies_are_sent_as_they_are(self):
+        response = self.client.get('/predict_temperature', query_string=OBSERVATION, headers={'Accept-Encoding': 'gzip'})
+        self.assertLess(len(response.get_data()), compression.COMPRESS_MIN_SIZE)
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_choose_encoding_respects_q_values(self):
+        self.assertEqual(compression.choose_encoding(parse_accept_header('gzip;q=0.5, identity')), 'gzip')
+        self.assertIsNone(compression.choose_encoding(parse_accept_header('gzip;q=0, deflate')))
+
+
+class RevalidationTestCase(unittest.TestCase):
+    # A 304 must carry the same ETag and Vary as the 200 it stands for (RFC 9110 15.4.5)
+
+    def setUp(self):
+        self.client = client()
+
+    def assert_revalidates(self, url, **kwargs):
+        for accept_encoding, weak in (('gzip', True), (None, False)):
+            headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+            full = self.client.get(url, headers=headers, **kwargs)
+            self.assertEqual(full.status_code, 200)
+            etag = full.headers['ETag']
+            self.assertEqual(etag.startswith('W/'), weak, etag)
+            self.assertIn('max-age=', full.headers['Cache-Control'])
+            cached = self.client.get(url, headers=dict(headers, **{'If-None-Match': etag}), **kwargs)
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(cached.get_data(), b'')
+            for header in ('ETag', 'Vary', 'Cache-Control'):
+                self.assertEqual(cached.headers.get(header), full.headers.get(header), header)
+        return full
+
+
+class ConditionalRequestTest(RevalidationTestCase):
+
+    def test_predict_temperature_revalidates(self):
+        self.assert_revalidates('/predict_temperature', query_string=OBSERVATION)
+
+    def test_other_inputs_get_a_new_etag(self):
+        first = self.client.get('/predict_temperature', query_string=OBSERVATION)
+        other = self.client.get('/predict_temperature', query_string=dict(OBSERVATION, humidity=71),
+                                headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(other.status_code, 200)
+        self.assertNotEqual(other.headers['ETag'], first.headers['ETag'])
+
+
+class WeatherConditionalRequestTest(RevalidationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.mock = MockOpenWeather()
+        server = serve(self.mock, port=0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        patches = [
+            mock.patch.multiple(upstream, BASE_URL=f'http://127.0.0.1:{server.server_address[1]}/',
+                                current_weather_cache=TTLCache(100, 300), forecast_cache=TTLCache(100, 1800)),
+            mock.patch.object(app, 'OPENWEATHER_API_KEY', 'test'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_weather_revalidates_without_upstream_calls(self):
+        response = self.assert_revalidates('/weather', query_string={'city': 'Paris'})
+        self.assertIn('Last-Modified', response.headers)
+        self.assertEqual(self.mock.calls, {'weather': 1, 'forecast': 1})
+
+    def test_weather_if_modified_since(self):
+        full = self.client.get('/weather', query_string={'city': 'Paris'})
+        cached = self.client.get('/weather', query_string={'city': 'Paris'},
+                                 headers={'If-Modified-Since': full.headers['Last-Modified']})
+        self.assertEqual(cached.status_code, 304)
+
+    @unittest.skipIf(asgi is None, "needs the ASGI packages")
+    def test_asgi_weather_matches_the_wsgi_headers(self):
+        with TestClient(asgi.app) as asgi_client:
+            for accept_encoding in ('gzip', 'identity'):
+                headers = {'Accept-Encoding': accept_encoding}
+                wsgi_response = self.client.get('/weather', query_string={'city': 'Paris'}, headers=headers)
+                full = asgi_client.get('/weather', params={'city': 'Paris'}, headers=headers)
+                cached = asgi_client.get('/weather', params={'city': 'Paris'},
+                                         headers=dict(headers, **{'If-None-Match': full.headers['ETag']}))
+                self.assertEqual(cached.status_code, 304)
+                # Vary also gets Origin from Starlette's CORS middleware
+                self.assertIn('Accept-Encoding', full.headers['Vary'])
+                for header in ('ETag', 'Cache-Control'):
+                    self.assertEqual(full.headers.get(header), wsgi_response.headers.get(header), header)
+                for header in ('ETag', 'Vary', 'Cache-Control'):
+                    self.assertEqual(cached.headers.get(header), full.headers.get(header), header)
+
+
+if __name__ == '__main__':
+    unittest.main()
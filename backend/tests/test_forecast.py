@@ -0,0 +1,35 @@
+import unittest
+
+from forecast import DailyForecastAggregator, summarize_forecast
+
+
+def item(dt, temp, description, icon, pop=0.0):
+    return {"dt": dt, "main": {"temp": temp, "temp_max": temp + 1, "temp_min": temp - 1},
+            "weather": [{"description": description, "icon": icon}], "pop": pop}
+
+
+class SummarizeForecastTest(unittest.TestCase):
+
+    def test_description_is_the_first_slot_and_dominant_is_the_most_frequent(self):
+        # 2024-01-01 00:00 UTC and the next three 3 hour slots
+        items = [item(1704067200 + n * 10800, 10 + n, *condition, pop=n / 10)
+                 for n, condition in enumerate([('clear sky', '01d'), ('light rain', '10d'),
+                                                ('light rain', '10d'), ('mist', '50d')])]
+        day, = summarize_forecast({"city": {"timezone": 0}, "list": items})
+        self.assertEqual(day["date"], '2024-01-01')
+        self.assertEqual((day["description"], day["icon"]), ('clear sky', '01d'))
+        self.assertEqual((day["dominant_description"], day["dominant_icon"]), ('light rain', '10d'))
+        self.assertEqual((day["temp_max"], day["temp_min"], day["temp_mean"], day["pop"]), (14, 9, 11.5, 0.3))
+
+    def test_items_are_bucketed_by_local_date(self):
+        # 22:00 and 23:00 UTC are already the next day at UTC+3
+        aggregator = DailyForecastAggregator(3 * 3600)
+        aggregator.extend([item(1704060000, 5, 'mist', '50n'), item(1704063600, 6, 'mist', '50n')])
+        self.assertEqual([day["date"] for day in aggregator.summary()], ['2024-01-01'])
+        aggregator = DailyForecastAggregator(0)
+        aggregator.add(item(1704060000, 5, 'mist', '50n'))
+        self.assertEqual([day["date"] for day in aggregator.summary()], ['2023-12-31'])
+
+
+if __name__ == '__main__':
+    unittest.main()
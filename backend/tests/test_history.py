@@ -0,0 +1,110 @@
+import os
+import tempfile
+import time
+import unittest
+
+import db
+from history import query_aggregates, query_observations
+from migrations import apply_migrations
+from tests.app_support import client
+
+# 2024-01-01 00:00:00 UTC
+DAY_START = 1704067200
+
+
+class HistoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.conn = db.connect(os.path.join(directory.name, 'weather_data.db'))
+        self.addCleanup(self.conn.close)
+        apply_migrations(self.conn)
+
+    def insert(self, city, collected_at, temperature=20.0, timestamp=None):
+        timestamp = timestamp or time.strftime(db.TIMESTAMP_FORMAT, time.localtime(collected_at))
+        self.conn.execute(db.INSERT_OBSERVATION, (city, 'GB', 'clear sky', temperature, 50, '01d', 1000,
+                                                   temperature, 2.0, timestamp, collected_at))
+        self.conn.commit()
+
+
+class KeysetCursorTest(HistoryTestCase):
+
+    def test_raw_pages_cover_every_row_once(self):
+        # Rows sharing a collected_at are split across pages by id
+        for n in range(7):
+            self.insert('London', DAY_START + n // 2, temperature=n, timestamp=f'row {n}')
+        self.insert('London', DAY_START + 100)
+        pages, cursor = [], None
+        while True:
+            rows, cursor = query_observations(self.conn, 'London', DAY_START, DAY_START + 100, 3, cursor)
+            pages.append([row["temperature"] for row in rows])
+            if cursor is None:
+                break
+        self.assertEqual(pages, [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_last_full_page_has_no_cursor(self):
+        for n in range(3):
+            self.insert('London', DAY_START + n)
+        rows, cursor = query_observations(self.conn, 'London', DAY_START, DAY_START + 60, 3)
+        self.assertEqual((len(rows), cursor), (3, None))
+
+    def test_aggregate_pages_continue_after_the_last_bucket(self):
+        for hour in range(5):
+            self.insert('London', DAY_START + hour * 3600, temperature=hour)
+            self.insert('London', DAY_START + hour * 3600 + 60, temperature=hour + 1)
+        buckets, cursor = query_aggregates(self.conn, 'London', DAY_START, DAY_START + 86400, 3600, 2)
+        self.assertEqual([(b["period"], b["count"], b["temperature_avg"]) for b in buckets],
+                         [('2024-01-01 00:00:00', 2, 0.5), ('2024-01-01 01:00:00', 2, 1.5)])
+        self.assertEqual(cursor, str(DAY_START + 3600))
+        buckets, cursor = query_aggregates(self.conn, 'London', DAY_START, DAY_START + 86400, 3600, 2, cursor)
+        self.assertEqual([b["bucket_start"] for b in buckets], [DAY_START + 7200, DAY_START + 10800])
+        buckets, cursor = query_aggregates(self.conn, 'London', DAY_START, DAY_START + 86400, 3600, 2, cursor)
+        self.assertEqual(([b["bucket_start"] for b in buckets], cursor), ([DAY_START + 14400], None))
+
+    def test_invalid_cursor(self):
+        for cursor in ('abc', '1', '1:2:3'):
+            with self.assertRaises(ValueError):
+                query_observations(self.conn, 'London', DAY_START, DAY_START + 60, 3, cursor)
+        with self.assertRaises(ValueError):
+            query_aggregates(self.conn, 'London', DAY_START, DAY_START + 60, 3600, 3, '1:2')
+
+
+class CityMatchingTest(HistoryTestCase):
+
+    def test_city_matches_case_insensitively(self):
+        self.insert('London', DAY_START)
+        self.insert('Paris', DAY_START)
+        for city in ('London', 'london', 'LONDON'):
+            rows, _ = query_observations(self.conn, city, DAY_START, DAY_START + 60, 10)
+            self.assertEqual([row["city"] for row in rows], ['London'])
+        buckets, _ = query_aggregates(self.conn, 'lONDON', DAY_START, DAY_START + 86400, 3600, 10)
+        self.assertEqual([bucket["count"] for bucket in buckets], [1])
+
+    def test_queries_use_the_nocase_index(self):
+        plan = self.conn.execute('''
+            EXPLAIN QUERY PLAN SELECT id FROM current_weather
+            WHERE city = ? COLLATE NOCASE AND collected_at >= ? AND collected_at < ?
+        ''', ('london', 0, 1)).fetchall()
+        self.assertIn('idx_current_weather_city_nocase_collected_at', ' '.join(row[-1] for row in plan))
+
+
+class HistoryEndpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = client()
+
+    def test_invalid_limit_is_rejected(self):
+        for limit in ('abc', '-5', '0', '1.5', '100000'):
+            response = self.client.get('/history', query_string={'city': 'London', 'limit': limit})
+            self.assertEqual(response.status_code, 400, limit)
+            self.assertIn('limit', response.get_json()["error"])
+
+    def test_valid_limit(self):
+        response = self.client.get('/history', query_string={'city': 'London', 'limit': '5'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["observations"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
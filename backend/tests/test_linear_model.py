@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from features import FeatureEncoder
+from linear_model import LinearModel, is_exported_from
+from tests.app_support import app
+
+try:
+    import joblib
+    import pandas as pd
+    import sklearn  # noqa: F401  (needed to unpickle the model)
+except ImportError:  # pip install scikit-learn joblib pandas
+    joblib = None
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.path.join(BACKEND_DIR, 'linear_regression_model.joblib')
+LINEAR_MODEL_PATH = os.path.join(BACKEND_DIR, 'linear_model.json')
+
+# (humidity, pressure, wind_speed, hour_of_day, day_of_week, month), categories
+OBSERVATIONS = [
+    ((70, 1008, 4.1, 3, 0, 1), {'city': 'Mumbai', 'country': 'IN', 'description': 'mist', 'icon': '50n'}),
+    ((40, 1021, 1.2, 14, 5, 7), {'city': 'Tokyo', 'country': 'JP', 'description': 'few clouds', 'icon': '02n'}),
+    ((85, 995, 9.8, 23, 6, 12), {'city': 'Toronto', 'country': 'CA', 'description': 'light rain', 'icon': '10n'}),
+    # Categories the model has never seen: every one-hot column stays 0
+    ((55, 1013, 3.0, 9, 2, 4), {'city': 'Lagos', 'country': 'NG', 'description': 'smoke', 'icon': '50d'}),
+    ((20, 1030, 0.0, 12, 3, 6), {'city': 'Dubai', 'country': 'ZZ', 'description': 'clear sky', 'icon': '99x'}),
+]
+
+
+@unittest.skipIf(joblib is None, "needs scikit-learn, joblib and pandas")
+class LinearModelParityTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sklearn_model = joblib.load(MODEL_PATH)
+        cls.linear_model = LinearModel.load(LINEAR_MODEL_PATH)
+
+    def sklearn_predictions(self):
+        # The notebook's encoding: one-hot with pandas, then the training columns in training order
+        frame = pd.DataFrame([dict(zip(('humidity', 'pressure', 'wind_speed', 'hour_of_day', 'day_of_week', 'month'), numeric),
+                                   **categories) for numeric, categories in OBSERVATIONS])
+        frame = pd.get_dummies(frame, columns=['city', 'country', 'description', 'icon'], dtype=float)
+        frame = frame.reindex(columns=self.sklearn_model.feature_names_in_, fill_value=0.0)
+        return self.sklearn_model.predict(frame)
+
+    def test_linear_model_and_encoder_match_sklearn(self):
+        encoder = FeatureEncoder(self.linear_model.feature_names_in_)
+        matrix = np.zeros((len(OBSERVATIONS), encoder.n_features))
+        for row, (numeric, categories) in zip(matrix, OBSERVATIONS):
+            encoder.encode_into(row, numeric, categories)
+        np.testing.assert_allclose(self.linear_model.predict(matrix), self.sklearn_predictions(), rtol=0, atol=1e-9)
+
+    def test_committed_json_was_exported_from_the_committed_joblib(self):
+        self.assertEqual(list(self.linear_model.feature_names_in_), list(self.sklearn_model.feature_names_in_))
+        np.testing.assert_array_equal(self.linear_model.coef_, self.sklearn_model.coef_.ravel())
+        self.assertTrue(is_exported_from(LINEAR_MODEL_PATH, MODEL_PATH),
+                        "linear_model.json is stale: run export_model.py")
+
+
+class StaleExportTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.model_path = os.path.join(directory.name, 'model.joblib')
+        self.linear_path = os.path.join(directory.name, 'linear_model.json')
+        shutil.copy(MODEL_PATH, self.model_path)
+        shutil.copy(LINEAR_MODEL_PATH, self.linear_path)
+
+    def test_retrained_joblib_is_detected(self):
+        self.assertTrue(is_exported_from(self.linear_path, self.model_path))
+        with open(self.model_path, 'ab') as f:
+            f.write(b'retrained')
+        self.assertFalse(is_exported_from(self.linear_path, self.model_path))
+
+    def test_export_without_digest_is_not_trusted(self):
+        with open(self.linear_path) as f:
+            data = json.load(f)
+        del data['source_digest']
+        with open(self.linear_path, 'w') as f:
+            json.dump(data, f)
+        self.assertFalse(is_exported_from(self.linear_path, self.model_path))
+
+    def test_app_falls_back_to_joblib_for_a_stale_export(self):
+        with mock.patch.multiple(app, MODEL_PATH=self.model_path, LINEAR_MODEL_PATH=self.linear_path):
+            for backend, expected in (('auto', self.linear_path), ('linear', self.linear_path), ('sklearn', self.model_path)):
+                with mock.patch.object(app, 'MODEL_BACKEND', backend):
+                    self.assertEqual(app.predictive_model_path(), expected)
+            with open(self.model_path, 'ab') as f:
+                f.write(b'retrained')
+            for backend, expected in (('auto', self.model_path), ('linear', self.linear_path)):
+                with mock.patch.object(app, 'MODEL_BACKEND', backend):
+                    self.assertEqual(app.predictive_model_path(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import os
+import sqlite3
+from concurrent.futures import Future
+import tempfile
+import time
+import unittest
+
+import load_csv_to_db
+from load_csv_to_db import MultilineFieldError, load_data_from_csv_to_db, parse_range, parse_ranges, plan_file
+
+HEADER = ','.join(load_csv_to_db.CSV_COLUMNS) + '\n'
+
+
+def csv_line(n, description='clear sky'):
+    return f'City{n},IN,{description},{n}.5,{n % 100},01d,1000,{n}.0,1.5,2024-01-01 00:{n // 60 % 60:02d}:{n % 60:02d}\n'
+
+
+class CsvFileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write_csv(self, body, name='test_current_weather.csv', newline='\n'):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w', newline='') as f:
+            f.write((HEADER + body).replace('\n', newline))
+        return path
+
+    def parse_all(self, path, split_bytes):
+        positions, data_start, ranges = plan_file(path, split_bytes)
+        rows, skipped = [], 0
+        for start, end in ranges:
+            range_rows, range_skipped = parse_range(path, positions, data_start, start, end)
+            rows.extend(range_rows)
+            skipped += range_skipped
+        return rows, skipped
+
+
+class ParseRangeTest(CsvFileTestCase):
+
+    def test_every_line_is_parsed_exactly_once_for_any_split(self):
+        path = self.write_csv(''.join(csv_line(n) for n in range(200)))
+        expected = [f'City{n}' for n in range(200)]
+        # Range sizes smaller than a line, equal to it, and not dividing the file evenly
+        for split_bytes in (1, 7, len(csv_line(0)), 100, 1013, 10 ** 6):
+            rows, skipped = self.parse_all(path, split_bytes)
+            self.assertEqual([row[0] for row in rows], expected, f"split_bytes={split_bytes}")
+            self.assertEqual(skipped, 0)
+
+    def test_range_starting_exactly_at_a_line_start_keeps_that_line(self):
+        path = self.write_csv(csv_line(1) + csv_line(2))
+        positions, data_start, _ = plan_file(path, 10 ** 6)
+        second_line = data_start + len(csv_line(1))
+        first, _ = parse_range(path, positions, data_start, data_start, second_line)
+        second, _ = parse_range(path, positions, data_start, second_line, second_line + 1)
+        self.assertEqual([row[0] for row in first], ['City1'])
+        self.assertEqual([row[0] for row in second], ['City2'])
+
+    def test_crlf_line_endings_and_missing_final_newline(self):
+        path = self.write_csv(''.join(csv_line(n) for n in range(50)).rstrip('\n'), newline='\r\n')
+        rows, _ = self.parse_all(path, 64)
+        self.assertEqual([row[0] for row in rows], [f'City{n}' for n in range(50)])
+        self.assertEqual(rows[-1][-2], '2024-01-01 00:00:49')
+
+    def test_quoted_commas_are_kept_in_one_field(self):
+        path = self.write_csv(csv_line(1, '"rain, heavy"'))
+        rows, _ = self.parse_all(path, 10)
+        self.assertEqual(rows[0][2], 'rain, heavy')
+
+    def test_bad_rows_are_skipped_and_epoch_is_local_time(self):
+        path = self.write_csv(csv_line(1) + 'City2,IN,mist,1,2,01d,1000,1.0,1.5,not a time\n' + 'short,row\n')
+        rows, skipped = self.parse_all(path, 10 ** 6)
+        self.assertEqual(skipped, 2)
+        self.assertEqual(rows[0][-1], int(time.mktime((2024, 1, 1, 0, 0, 1, 0, 0, -1))))
+
+    def test_quoted_field_with_line_break_is_rejected(self):
+        path = self.write_csv(csv_line(1) + csv_line(2, '"broken\nclouds"') + csv_line(3))
+        with self.assertRaises(MultilineFieldError):
+            self.parse_all(path, 10)
+
+    def test_header_only_file_has_no_ranges(self):
+        path = self.write_csv('')
+        self.assertEqual(plan_file(path, 100)[2], [])
+
+    def test_missing_column_is_reported(self):
+        path = os.path.join(self.dir.name, 'bad_current_weather.csv')
+        with open(path, 'w') as f:
+            f.write('city,country\nA,B\n')
+        with self.assertRaises(ValueError):
+            plan_file(path, 100)
+
+
+class RecordingExecutor:
+    # Runs tasks on submit and records how many results are waiting to be consumed
+
+    def __init__(self):
+        self.outstanding = 0
+        self.max_outstanding = 0
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        self.outstanding += 1
+        self.max_outstanding = max(self.max_outstanding, self.outstanding)
+        return future
+
+
+class ParseRangesTest(CsvFileTestCase):
+
+    def test_work_in_flight_is_bounded(self):
+        path = self.write_csv(''.join(csv_line(n) for n in range(500)))
+        positions, data_start, ranges = plan_file(path, 64)
+        executor = RecordingExecutor()
+        cities = []
+        for rows, _ in parse_ranges(executor, 3, path, positions, data_start, ranges):
+            executor.outstanding -= 1
+            cities.extend(row[0] for row in rows)
+        self.assertGreater(len(ranges), 100)
+        self.assertLessEqual(executor.max_outstanding, 3 * 2)
+        self.assertEqual(cities, [f'City{n}' for n in range(500)])
+
+
+class LoadTest(CsvFileTestCase):
+
+    def load(self, path, **kwargs):
+        database = os.path.join(self.dir.name, 'weather.db')
+        load_data_from_csv_to_db([path], database, **kwargs)
+        with sqlite3.connect(database) as conn:
+            return conn.execute('SELECT city, description FROM current_weather ORDER BY city').fetchall()
+
+    def test_parallel_load_with_small_ranges(self):
+        path = self.write_csv(''.join(csv_line(n) for n in range(300)))
+        rows = self.load(path, workers=2, split_bytes=512, chunksize=50)
+        self.assertEqual(len(rows), 300)
+
+    def test_multiline_fields_fall_back_to_the_streaming_reader(self):
+        body = ''.join(csv_line(n) for n in range(100)) + csv_line(100, '"broken\nclouds"') + csv_line(101)
+        path = self.write_csv(body)
+        rows = self.load(path, workers=2, split_bytes=256, chunksize=10)
+        self.assertEqual(len(rows), 102)
+        self.assertIn(('City100', 'broken\nclouds'), rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import logging
+import unittest
+
+from logging_setup import RateLimitFilter
+from tests.app_support import app, client
+
+UNKNOWN = {"city": "Unseen City", "humidity": 70, "pressure": 1008, "wind_speed": 4.1,
+           "description": "smoke", "icon": "99x", "country_code": "ZZ"}
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class RateLimitFilterTest(unittest.TestCase):
+
+    def make_record(self, msg, *args, level=logging.WARNING):
+        return logging.LogRecord('weather.test', level, __file__, 0, msg, args, None)
+
+    def test_one_template_is_one_bucket(self):
+        limit = RateLimitFilter(burst=2, interval=60)
+        passed = [limit.filter(self.make_record("City '%s' is unknown", city)) for city in 'ABCD']
+        self.assertEqual(passed, [True, True, False, False])
+        self.assertEqual(limit.suppressed_total, 2)
+        # a different template has its own bucket, and records below WARNING are never limited
+        self.assertTrue(limit.filter(self.make_record("Icon '%s' is unknown", 'x')))
+        self.assertTrue(limit.filter(self.make_record("City '%s' is unknown", 'E', level=logging.INFO)))
+
+    def test_suppressed_count_is_reported_after_the_window(self):
+        limit = RateLimitFilter(burst=1, interval=60)
+        limit.filter(self.make_record("City '%s' is unknown", 'A'))
+        limit.filter(self.make_record("City '%s' is unknown", 'B'))
+        limit.interval = 0  # the window is over
+        record = self.make_record("City '%s' is unknown", 'C')
+        self.assertTrue(limit.filter(record))
+        self.assertEqual(record.suppressed, 1)
+
+
+class UnknownFeatureWarningTest(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = ListHandler()
+        self.handler.addFilter(RateLimitFilter(burst=1, interval=60))
+        app.log.addHandler(self.handler)
+        self.addCleanup(app.log.removeHandler, self.handler)
+        self.client = client()
+
+    def warned_features(self):
+        return [record.feature for record in self.handler.records]
+
+    def test_each_kind_is_rate_limited_separately(self):
+        # A flood of unknown cities uses up the city bucket but not the others
+        for n in range(3):
+            self.client.get('/predict_temperature', query_string=dict(UNKNOWN, city=f"Unseen City {n}"))
+        self.assertEqual(sorted(self.warned_features()),
+                         ['city_Unseen City 0', 'country_ZZ', 'description_smoke', 'icon_99x'])
+
+    def test_batch_warnings_are_rate_limited_separately_from_single_ones(self):
+        self.client.get('/predict_temperature', query_string=UNKNOWN)
+        self.client.post('/predict_temperature/batch', json=[UNKNOWN, UNKNOWN])
+        self.assertEqual(len(self.handler.records), 8)
+        batch_records = self.handler.records[4:]
+        self.assertTrue(all('in 2 batch rows' in record.getMessage() for record in batch_records))
+
+
+if __name__ == '__main__':
+    unittest.main()
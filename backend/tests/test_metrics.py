@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import metrics
+from metrics import BUCKETS, DEAD_WORKERS_FILE, Registry, fcntl, mark_process_dead, merge, render
+
+
+def worker_snapshot(requests, latencies):
+    # A registry as one gunicorn worker would have it; METRICS_DIR is unset here, so no flush
+    # thread is started
+    registry = Registry()
+    registry.inc('weather_cache_hits_total', requests, cache='current')
+    registry.inc(metrics.UPSTREAM_ERRORS, endpoint='current', reason='timeout')
+    for seconds in latencies:
+        registry.observe(metrics.STAGE_SECONDS, seconds, stage='upstream_current')
+    registry.register_collector(lambda: [('gauge', 'weather_cache_entries', {'cache': 'current'}, requests)])
+    return registry.snapshot()
+
+
+def write_snapshot(directory, name, snapshot):
+    with open(os.path.join(directory, name), 'w') as f:
+        json.dump(snapshot, f)
+
+
+def bucket_index(seconds):
+    return next(n for n, bound in enumerate(BUCKETS) if seconds <= bound)
+
+
+class MetricsServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+        self.addCleanup(self.tmp.cleanup)
+        patcher = mock.patch.object(metrics, 'METRICS_DIR', self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_workers(self):
+        write_snapshot(self.directory, '1001.json', worker_snapshot(3, [0.002, 0.3]))
+        write_snapshot(self.directory, '1002.json', worker_snapshot(4, [0.002, 20.0]))
+
+    def test_snapshots_of_all_workers_are_merged(self):
+        self.write_workers()
+        counters, gauges, histograms = merge(Registry().server_snapshots())
+
+        self.assertEqual(counters[('weather_cache_hits_total', (('cache', 'current'),))], 7)
+        self.assertEqual(counters[(metrics.UPSTREAM_ERRORS, (('endpoint', 'current'), ('reason', 'timeout')))], 2)
+        self.assertEqual(gauges[('weather_cache_entries', (('cache', 'current'),))], 7)
+
+        buckets, total, count = histograms[(metrics.STAGE_SECONDS, (('stage', 'upstream_current'),))]
+        expected = [0] * (len(BUCKETS) + 1)
+        expected[bucket_index(0.002)] = 2
+        expected[bucket_index(0.3)] = 1
+        expected[-1] = 1  # 20s is past the last bound
+        self.assertEqual(buckets, expected)
+        self.assertAlmostEqual(total, 20.304)
+        self.assertEqual(count, 4)
+
+    def test_unreadable_snapshot_is_skipped(self):
+        self.write_workers()
+        with open(os.path.join(self.directory, '1003.json'), 'w') as f:
+            f.write('{"counters": [')  # a worker that died mid-write without the tmp/rename
+        counters, _, _ = merge(Registry().server_snapshots())
+        self.assertEqual(counters[('weather_cache_hits_total', (('cache', 'current'),))], 7)
+
+    @unittest.skipIf(fcntl is None, "dead.json needs fcntl")
+    def test_dead_workers_keep_their_counters_but_not_gauges(self):
+        self.write_workers()
+        mark_process_dead(1001, self.directory)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, '1001.json')))
+
+        with open(os.path.join(self.directory, DEAD_WORKERS_FILE)) as f:
+            dead = json.load(f)
+        self.assertNotIn('gauges', dead)
+
+        write_snapshot(self.directory, '1003.json', worker_snapshot(5, [0.002]))
+        mark_process_dead(1003, self.directory)
+        mark_process_dead(1004, self.directory)  # exited before its first flush
+
+        counters, gauges, histograms = merge(Registry().server_snapshots())
+        self.assertEqual(counters[('weather_cache_hits_total', (('cache', 'current'),))], 12)
+        self.assertEqual(gauges[('weather_cache_entries', (('cache', 'current'),))], 4)  # only 1002 is alive
+        _, _, count = histograms[(metrics.STAGE_SECONDS, (('stage', 'upstream_current'),))]
+        self.assertEqual(count, 5)
+
+    def test_prometheus_rendering(self):
+        self.write_workers()
+        lines = render(Registry().server_snapshots()).splitlines()
+
+        self.assertIn('# TYPE weather_cache_hits_total counter', lines)
+        self.assertIn('weather_cache_hits_total{cache="current"} 7', lines)
+        self.assertIn('weather_cache_entries{cache="current"} 7', lines)
+        # every lookup was a hit, so the ratio is derived from the merged counters
+        self.assertIn('weather_cache_hit_ratio{cache="current"} 1.0', lines)
+
+        name = metrics.STAGE_SECONDS
+        self.assertIn(f'# TYPE {name} histogram', lines)
+        # buckets are cumulative and end at the total count
+        self.assertIn(f'{name}_bucket{{stage="upstream_current",le="0.001"}} 0', lines)
+        self.assertIn(f'{name}_bucket{{stage="upstream_current",le="0.0025"}} 2', lines)
+        self.assertIn(f'{name}_bucket{{stage="upstream_current",le="0.5"}} 3', lines)
+        self.assertIn(f'{name}_bucket{{stage="upstream_current",le="10.0"}} 3', lines)
+        self.assertIn(f'{name}_bucket{{stage="upstream_current",le="+Inf"}} 4', lines)
+        self.assertIn(f'{name}_count{{stage="upstream_current"}} 4', lines)
+        self.assertTrue(any(line.startswith(f'{name}_sum{{stage="upstream_current"}} 20.30') for line in lines))
+
+    def test_label_values_are_escaped(self):
+        lines = render([{"counters": [['weather_unknown_features_total', [['feature', 'city_"a\\b"\n']], 1]]}])
+        self.assertIn('weather_unknown_features_total{feature="city_\\"a\\\\b\\"\\n"} 1', lines.splitlines())
+
+
+if __name__ == '__main__':
+    unittest.main()
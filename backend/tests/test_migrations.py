@@ -0,0 +1,78 @@
+import os
+import tempfile
+import time
+import unittest
+
+import db
+from migrations import LATEST_VERSION, apply_migrations, get_version
+
+LEGACY_INSERT = '''
+    INSERT INTO current_weather (city, country, description, feels_like, humidity, icon, pressure,
+                                 temperature, wind_speed, collection_timestamp)
+    VALUES (?, 'GB', 'clear sky', 20.0, 50, '01d', 1000, 21.0, 2.0, ?)
+'''
+
+
+class MigrationsTest(unittest.TestCase):
+
+    def setUp(self):
+        # collection_timestamp is local time; a zone away from UTC (and without DST) makes that visible
+        self.addCleanup(self.set_timezone, os.environ.get('TZ'))
+        self.set_timezone('Asia/Kolkata')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.conn = db.connect(os.path.join(directory.name, 'weather_data.db'))
+        self.addCleanup(self.conn.close)
+
+    def set_timezone(self, tz):
+        if tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = tz
+        time.tzset()
+
+    def index_names(self):
+        return {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+    def test_new_database_reaches_latest_version(self):
+        self.assertEqual(apply_migrations(self.conn), list(range(1, LATEST_VERSION + 1)))
+        self.assertEqual(get_version(self.conn), LATEST_VERSION)
+        self.assertLessEqual({'idx_current_weather_city_collected_at', 'idx_current_weather_city_timestamp',
+                              'idx_current_weather_city_nocase_collected_at'}, self.index_names())
+        self.assertEqual(apply_migrations(self.conn), [])
+
+    def test_existing_database_is_upgraded(self):
+        # A database created before migrations existed: table present, user_version 0,
+        # no collected_at and a CSV loaded twice
+        self.conn.execute(db.CREATE_CURRENT_WEATHER_TABLE)
+        for city, timestamp in [('London', '2024-01-01 05:30:01'), ('London', '2024-01-01 05:30:01'),
+                                ('Paris', '2024-01-01 06:30:00')]:
+            self.conn.execute(LEGACY_INSERT, (city, timestamp))
+        self.conn.commit()
+
+        self.assertEqual(apply_migrations(self.conn), list(range(1, LATEST_VERSION + 1)))
+        rows = self.conn.execute('SELECT id, city, collected_at FROM current_weather ORDER BY id').fetchall()
+        # Duplicates keep their first copy; collection_timestamp is read as local time (UTC+5:30)
+        self.assertEqual(rows, [(1, 'London', 1704067201), (3, 'Paris', 1704070800)])
+
+    def test_trigger_fills_collected_at_for_old_writers(self):
+        apply_migrations(self.conn)
+        self.conn.execute(LEGACY_INSERT, ('London', '2024-01-01 05:30:01'))
+        self.conn.commit()
+        self.assertEqual(self.conn.execute('SELECT collected_at FROM current_weather').fetchone(), (1704067201,))
+
+    def test_observation_time_is_local_text_and_real_epoch(self):
+        collection_timestamp, collected_at = db.observation_time()
+        self.assertLess(abs(collected_at - time.time()), 2)
+        self.assertEqual(db.timestamp_to_epoch(collection_timestamp), collected_at)
+        self.assertEqual(db.timestamp_to_epoch('2024-01-01 05:30:01'), 1704067201)
+
+    def test_version_applied_elsewhere_is_skipped(self):
+        apply_migrations(self.conn)
+        self.conn.execute('DROP INDEX idx_current_weather_city_nocase_collected_at')
+        self.assertEqual(apply_migrations(self.conn), [])
+        self.assertNotIn('idx_current_weather_city_nocase_collected_at', self.index_names())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+import db
+from migrations import migrate
+from observation_writer import ObservationWriter
+
+
+def row(n):
+    timestamp = time.strftime(db.TIMESTAMP_FORMAT, time.localtime(1704067200 + n))
+    return (f'City{n}', 'GB', 'clear sky', 20.0, 50, '01d', 1000, 21.0, 2.0, timestamp, 1704067200 + n)
+
+
+class ObservationWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'weather_data.db')
+        migrate(self.path)
+
+    def stored_cities(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            return [city for city, in conn.execute('SELECT city FROM current_weather ORDER BY id')]
+        finally:
+            conn.close()
+
+    def stalled_writer(self, overflow, max_queue=2, **kwargs):
+        # Returns a writer whose thread is stuck writing row 0, so the queue only fills up
+        writer = ObservationWriter(self.path, batch_size=1, flush_interval=0.01, max_queue=max_queue,
+                                   overflow=overflow, **kwargs)
+        writing, release = threading.Event(), threading.Event()
+        write = writer._write
+
+        def stalled_write(conn, batch):
+            writing.set()
+            release.wait(5)
+            write(conn, batch)
+
+        writer._write = stalled_write
+        self.addCleanup(writer.close)
+        self.addCleanup(release.set)
+        self.assertTrue(writer.submit(row(0)))
+        self.assertTrue(writing.wait(5))
+        return writer, release
+
+    def test_close_writes_everything_queued(self):
+        writer = ObservationWriter(self.path, batch_size=3, flush_interval=10)
+        for n in range(7):
+            self.assertTrue(writer.submit(row(n)))
+        writer.close()
+        self.assertEqual(self.stored_cities(), [f'City{n}' for n in range(7)])
+        self.assertEqual(writer.stats(), {"queued": 0, "enqueued": 7, "written": 7, "dropped": 0, "failed_batches": 0})
+        self.assertFalse(writer.submit(row(7)))
+
+    def test_drop_newest_rejects_the_new_row(self):
+        writer, release = self.stalled_writer('drop_newest')
+        self.assertEqual([writer.submit(row(n)) for n in (1, 2, 3)], [True, True, False])
+        release.set()
+        writer.close()
+        self.assertEqual(self.stored_cities(), ['City0', 'City1', 'City2'])
+        self.assertEqual(writer.stats()["dropped"], 1)
+
+    def test_drop_oldest_makes_room(self):
+        writer, release = self.stalled_writer('drop_oldest')
+        self.assertEqual([writer.submit(row(n)) for n in (1, 2, 3)], [True, True, True])
+        release.set()
+        writer.close()
+        self.assertEqual(self.stored_cities(), ['City0', 'City2', 'City3'])
+        self.assertEqual(writer.stats()["dropped"], 1)
+
+    def test_block_rejects_after_timeout(self):
+        writer, release = self.stalled_writer('block', block_timeout=0.05)
+        self.assertEqual([writer.submit(row(n)) for n in (1, 2)], [True, True])
+        started = time.monotonic()
+        self.assertFalse(writer.submit(row(3)))
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        release.set()
+        writer.close()
+        self.assertEqual(self.stored_cities(), ['City0', 'City1', 'City2'])
+
+    def test_close_gives_up_when_the_queue_stays_full(self):
+        writer, release = self.stalled_writer('drop_newest', max_queue=1)
+        self.assertTrue(writer.submit(row(1)))
+        writer.close(timeout=0.05)
+        self.assertFalse(writer.submit(row(2)))
+
+    def test_unknown_overflow_policy(self):
+        with self.assertRaises(ValueError):
+            ObservationWriter(self.path, overflow='drop_everything')
+
+
+if __name__ == '__main__':
+    unittest.main()
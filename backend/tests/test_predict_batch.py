@@ -0,0 +1,85 @@
+import json
+import unittest
+
+from tests.app_support import app, client
+
+OBSERVATION = {"city": "Mumbai", "humidity": 70, "pressure": 1008, "wind_speed": 4.1,
+               "description": "mist", "icon": "50n", "country_code": "IN"}
+
+
+class PredictBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = client()
+
+    def predict(self, rows):
+        response = self.client.post('/predict_temperature/batch', json=rows)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_matches_single_row_predictions(self):
+        rows = [OBSERVATION,
+                dict(OBSERVATION, city="Tokyo", country_code="JP", description="few clouds", icon="02n"),
+                dict(OBSERVATION, city="Unseen City", country_code="ZZ", description="smoke", icon="99x")]
+        batch = self.predict(rows)["results"]
+        for row, result in zip(rows, batch):
+            single = self.client.get('/predict_temperature', query_string=row).get_json()
+            self.assertEqual(result["predicted_temperature"], single["predicted_temperature"])
+            self.assertEqual(result["city"], row["city"])
+
+    def test_json_and_ndjson_give_the_same_results(self):
+        rows = [OBSERVATION, dict(OBSERVATION, collection_timestamp="2024-07-01 14:00:00")]
+        ndjson = '\n'.join(json.dumps(row) for row in rows) + '\n\n'
+        response = self.client.post('/predict_temperature/batch', data=ndjson, content_type='application/x-ndjson')
+        self.assertEqual(response.get_json(), self.predict(rows))
+
+    def test_collection_timestamp_sets_the_time_features(self):
+        results = self.predict([dict(OBSERVATION, collection_timestamp="2024-01-01 03:00:00"),
+                                dict(OBSERVATION, collection_timestamp="2024-07-01 15:00:00")])["results"]
+        self.assertNotEqual(results[0]["predicted_temperature"], results[1]["predicted_temperature"])
+
+    def test_invalid_rows_get_errors_and_the_rest_are_scored(self):
+        rows = [OBSERVATION,
+                dict(OBSERVATION, humidity=None),
+                dict(OBSERVATION, pressure="high"),
+                dict(OBSERVATION, wind_speed="nan"),
+                dict(OBSERVATION, humidity="inf"),
+                dict(OBSERVATION, collection_timestamp="yesterday"),
+                "not an object"]
+        body = self.predict(rows)
+        self.assertEqual((body["count"], body["errors"]), (7, 6))
+        self.assertIn("predicted_temperature", body["results"][0])
+        errors = [result["error"] for result in body["results"][1:]]
+        self.assertIn("humidity", errors[0])
+        self.assertEqual(errors[1:4], ["humidity, pressure and wind_speed must be numbers",
+                                       "humidity, pressure and wind_speed must be finite numbers",
+                                       "humidity, pressure and wind_speed must be finite numbers"])
+        self.assertIn("collection_timestamp", errors[4])
+        self.assertEqual([result["index"] for result in body["results"]], list(range(7)))
+
+    def test_invalid_ndjson_line_is_a_row_error(self):
+        data = json.dumps(OBSERVATION) + '\n{"city": \n'
+        body = self.client.post('/predict_temperature/batch', data=data, content_type='application/x-ndjson').get_json()
+        self.assertEqual((body["count"], body["errors"]), (2, 1))
+        self.assertTrue(body["results"][1]["error"].startswith("Invalid JSON line"))
+
+    def test_body_must_be_an_array(self):
+        for kwargs in ({"json": OBSERVATION}, {"data": "not json", "content_type": "application/json"}):
+            response = self.client.post('/predict_temperature/batch', **kwargs)
+            self.assertEqual(response.status_code, 400)
+
+    def test_too_many_rows(self):
+        limit = app.PREDICT_BATCH_MAX_ROWS
+        app.PREDICT_BATCH_MAX_ROWS = 2
+        self.addCleanup(setattr, app, 'PREDICT_BATCH_MAX_ROWS', limit)
+        response = self.client.post('/predict_temperature/batch', json=[OBSERVATION] * 3)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.predict([OBSERVATION] * 2)["count"], 2)
+
+    def test_single_row_rejects_non_finite_values(self):
+        response = self.client.get('/predict_temperature', query_string=dict(OBSERVATION, humidity='nan'))
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+import profiling
+
+
+class ProfilingAccessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for patcher in (mock.patch.object(profiling, 'PROFILE_DIR', self.tmp.name),
+                        # no continuous sampler thread in tests
+                        mock.patch.object(profiling, 'ensure_continuous')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def client(self, **settings):
+        # The settings stay patched for the whole test: init_profiling reads them when it
+        # registers the routes, the middleware and the routes on every request
+        settings = dict({'PROFILING': False, 'PROFILING_CONTINUOUS': False, 'PROFILING_TOKEN': None}, **settings)
+        patcher = mock.patch.multiple(profiling, **settings)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        app = Flask(__name__)
+
+        @app.route('/ping')
+        def ping():
+            return 'pong'
+
+        profiling.init_profiling(app)
+        return app.test_client()
+
+    def test_flag_is_ignored_without_a_token(self):
+        client = self.client(PROFILING=True)
+        response = client.get('/ping', headers={'X-Profile': 'sample'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile', response.headers)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+        self.assertEqual(client.get('/debug/profiles').status_code, 404)
+
+    def test_continuous_only_does_not_expose_profiles_without_a_token(self):
+        with open(os.path.join(self.tmp.name, 'continuous-1.collapsed'), 'w') as f:
+            f.write('MainThread;main (app.py:1) 1\n')
+        client = self.client(PROFILING_CONTINUOUS=True)
+        self.assertEqual(client.get('/debug/profiles').status_code, 404)
+        self.assertEqual(client.get('/debug/profiles/continuous-1.collapsed').status_code, 404)
+
+    def test_token_is_required_for_the_flag_and_the_routes(self):
+        client = self.client(PROFILING=True, PROFILING_TOKEN='secret')
+
+        response = client.get('/ping', headers={'X-Profile': 'sample', 'X-Profile-Token': 'wrong'})
+        self.assertNotIn('X-Profile', response.headers)
+        self.assertEqual(client.get('/debug/profiles').status_code, 404)
+
+        response = client.get('/ping', headers={'X-Profile': 'sample', 'X-Profile-Token': 'secret'})
+        self.assertEqual(response.get_data(as_text=True), 'pong')
+        location = response.headers['X-Profile']
+        self.assertTrue(location.startswith('/debug/profiles/'))
+
+        listing = client.get('/debug/profiles', query_string={'_profile_token': 'secret'})
+        self.assertEqual(listing.get_json(), [location])
+        self.assertEqual(client.get(location).status_code, 404)
+        self.assertEqual(client.get(location, headers={'X-Profile-Token': 'secret'}).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from singleflight import AsyncSingleFlight, FileFlight, SingleFlight, fcntl
+
+
+def run_concurrently(target, count):
+    results, errors = [None] * count, [None] * count
+
+    def call(n):
+        try:
+            results[n] = target()
+        except Exception as e:
+            errors[n] = e
+
+    threads = [threading.Thread(target=call, args=(n,)) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.001)
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return {"temp": 21}
+
+        threads, results, errors = run_concurrently(lambda: flight.do('london', fetch), 5)
+        wait_for(lambda: flight.shared == 4)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(errors, [None] * 5)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True, True])
+        self.assertTrue(all(result is results[0][0] for result, _ in results))
+        self.assertEqual(flight.stats(), {"leaders": 1, "shared": 4, "in_flight": 0})
+
+    def test_leader_failure_reaches_every_caller(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fetch():
+            release.wait(5)
+            raise ConnectionError("upstream down")
+
+        threads, results, errors = run_concurrently(lambda: flight.do('london', fetch), 3)
+        wait_for(lambda: flight.shared == 2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(all(isinstance(error, ConnectionError) for error in errors))
+        # The failed call is not remembered: the next caller runs the function again
+        self.assertEqual(flight.do('london', lambda: 'ok'), ('ok', False))
+
+    def test_different_keys_do_not_wait_for_each_other(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do('a', lambda: flight.do('b', lambda: 2)[0] + 1), (3, False))
+        self.assertEqual(flight.stats()["leaders"], 2)
+
+
+class AsyncSingleFlightTest(unittest.TestCase):
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"temp": 21}
+
+        async def main():
+            return await asyncio.gather(*(flight.do('london', fetch) for _ in range(5)))
+
+        results = asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True, True])
+        self.assertTrue(all(result is results[0][0] for result, _ in results))
+        self.assertEqual(flight.stats(), {"leaders": 1, "shared": 4, "in_flight": 0})
+
+    def test_leader_failure_reaches_every_caller(self):
+        flight = AsyncSingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ConnectionError("upstream down")
+
+        async def main():
+            return await asyncio.gather(*(flight.do('london', fetch) for _ in range(3)), return_exceptions=True)
+
+        errors = asyncio.run(main())
+        self.assertTrue(all(isinstance(error, ConnectionError) for error in errors))
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+    def test_cancelled_caller_does_not_cancel_the_fetch(self):
+        flight = AsyncSingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return 'done'
+
+        async def main():
+            leader = asyncio.ensure_future(flight.do('london', fetch))
+            follower = asyncio.ensure_future(flight.do('london', fetch))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        self.assertEqual(asyncio.run(main()), ('done', True))
+
+
+@unittest.skipIf(fcntl is None, "FileFlight needs fcntl")
+class FileFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_concurrent_callers_share_one_call(self):
+        # Each call opens its own lock file description, so threads contend like workers do
+        flight = FileFlight(self.directory, share_ttl=60)
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.05)
+            return {"temp": 21}
+
+        threads, results, errors = run_concurrently(lambda: flight.do('weather:london', fetch), 4)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(errors, [None] * 4)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True])
+        self.assertTrue(all(result == {"temp": 21} for result, _ in results))
+
+    def test_shared_result_expires_after_ttl(self):
+        flight = FileFlight(self.directory, share_ttl=30)
+        now = time.time()
+        with mock.patch('singleflight.time.time', return_value=now):
+            self.assertEqual(flight.do('weather:london', lambda: 1), (1, False))
+        with mock.patch('singleflight.time.time', return_value=now + 29):
+            self.assertEqual(flight.do('weather:london', lambda: 2), (1, True))
+        with mock.patch('singleflight.time.time', return_value=now + 31):
+            self.assertEqual(flight.do('weather:london', lambda: 3), (3, False))
+        self.assertEqual(flight.do('weather:paris', lambda: 4), (4, False))
+
+    def test_leader_failure_is_not_shared(self):
+        flight = FileFlight(self.directory, share_ttl=60)
+
+        def fail():
+            raise ConnectionError("upstream down")
+
+        with self.assertRaises(ConnectionError):
+            flight.do('weather:london', fail)
+        self.assertEqual(flight.do('weather:london', lambda: 'ok'), ('ok', False))
+
+    def test_directory_does_not_grow_with_distinct_keys(self):
+        flight = FileFlight(self.directory, share_ttl=30, lock_stripes=8)
+
+        def unknown_city():
+            raise LookupError("city not found")
+
+        for n in range(100):
+            with self.assertRaises(LookupError):
+                flight.do(f'weather:nowhere {n}', unknown_city)
+        names = os.listdir(self.directory)
+        self.assertTrue(all(name.endswith('.lock') for name in names), names)
+        self.assertLessEqual(len(names), 8)
+
+    def test_expired_results_are_swept(self):
+        flight = FileFlight(self.directory, share_ttl=30)
+        for city in ('london', 'paris'):
+            _, result_path = flight._paths(f'weather:{city}')
+            flight.do(f'weather:{city}', lambda: city)
+            os.utime(result_path, (time.time() - 31, time.time() - 31))
+        # Sweeps run at most once per share_ttl; the first call above already did one
+        flight.do('weather:tokyo', lambda: 'tokyo')
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.endswith('.json')]), 3)
+        flight._next_sweep = 0.0
+        flight.do('weather:sydney', lambda: 'sydney')
+        remaining = sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+        self.assertEqual(remaining, sorted(os.path.basename(flight._paths(f'weather:{city}')[1]) for city in ('tokyo', 'sydney')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import upstream
+from bench.mock_openweather import MockOpenWeather, serve
+from cache import TTLCache
+from upstream import create_session
+
+
+class UnavailableHandler(BaseHTTPRequestHandler):
+    calls = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        type(self).calls += 1
+        body = b'{"cod":"503","message":"Service Unavailable"}'
+        self.send_response(503)
+        self.send_header('Retry-After', '30')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SessionRetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), UnavailableHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        UnavailableHandler.calls = 0
+
+    def test_retry_after_does_not_stall_the_request_thread(self):
+        session = create_session(retries=2, backoff=0.01)
+        started = time.monotonic()
+        response = session.get(f'http://127.0.0.1:{self.server.server_address[1]}/weather', timeout=5)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(UnavailableHandler.calls, 3)
+        self.assertLess(time.monotonic() - started, 2)
+
+
+class FetchCurrentManyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mock = MockOpenWeather()
+        server = serve(self.mock, port=0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        patches = mock.patch.multiple(
+            upstream,
+            BASE_URL=f'http://127.0.0.1:{server.server_address[1]}/',
+            current_weather_cache=TTLCache(100, 300),
+            city_ids=TTLCache(2, 86400)
+        )
+        patches.start()
+        self.addCleanup(patches.stop)
+
+    def test_known_ids_use_group_calls_and_the_id_map_is_bounded(self):
+        results = upstream.fetch_current_many(['Paris', 'Tokyo', 'Lima'], {"appid": "test"})
+        self.assertEqual({key: data["name"] for key, (data, fresh) in results.items()},
+                         {'paris': 'Paris', 'tokyo': 'Tokyo', 'lima': 'Lima'})
+        self.assertEqual(self.mock.calls, {'weather': 3})
+        # Only the two most recently learned IDs are kept
+        self.assertEqual(upstream.city_ids.stats()["size"], 2)
+
+        upstream.current_weather_cache.clear()
+        results = upstream.fetch_current_many(['Paris', 'Tokyo', 'Lima'], {"appid": "test"})
+        self.assertTrue(all(fresh for data, fresh in results.values()))
+        self.assertEqual(self.mock.calls, {'weather': 4, 'group': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
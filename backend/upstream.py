@@ -0,0 +1,344 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+from cache import TTLCache, normalize_city
+from singleflight import FileFlight, SingleFlight
+
+BASE_URL = os.getenv('OPENWEATHER_BASE_URL', "http://api.openweathermap.org/data/2.5/")
+
+# Shared HTTP client settings. The pool should be at least as large as the number of threads
+# that can call upstream at once (request threads + UPSTREAM_WORKERS), otherwise connections
+# get thrown away instead of being kept alive.
+UPSTREAM_POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', '16'))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', '3.05'))
+UPSTREAM_READ_TIMEOUT = float(os.getenv('UPSTREAM_READ_TIMEOUT', '10'))
+UPSTREAM_RETRIES = int(os.getenv('UPSTREAM_RETRIES', '2'))
+UPSTREAM_BACKOFF = float(os.getenv('UPSTREAM_BACKOFF', '0.3'))
+
+# When enabled, the 'weather' and 'forecast' calls for a city run at the same time
+# instead of one after the other. Set UPSTREAM_CONCURRENT_FETCH=0 to go back to sequential calls.
+CONCURRENT_FETCH = os.getenv('UPSTREAM_CONCURRENT_FETCH', '1') == '1'
+UPSTREAM_WORKERS = int(os.getenv('UPSTREAM_WORKERS', '8'))
+
+# Response cache, keyed by normalized city name. OpenWeatherMap refreshes current conditions
+# roughly every 10 minutes and forecasts every 3 hours, so the two get separate TTLs.
+# Set WEATHER_CACHE_SIZE=0 to disable caching.
+WEATHER_CACHE_SIZE = int(os.getenv('WEATHER_CACHE_SIZE', '256'))
+CURRENT_WEATHER_CACHE_TTL = float(os.getenv('CURRENT_WEATHER_CACHE_TTL', '300'))
+FORECAST_CACHE_TTL = float(os.getenv('FORECAST_CACHE_TTL', '1800'))
+
+current_weather_cache = TTLCache(WEATHER_CACHE_SIZE, CURRENT_WEATHER_CACHE_TTL)
+forecast_cache = TTLCache(WEATHER_CACHE_SIZE, FORECAST_CACHE_TTL)
+
+# Concurrent cache misses for the same city share one upstream fetch. Within a worker this uses
+# threads; setting SINGLE_FLIGHT_DIR (a local directory shared by all workers) also coalesces
+# across gunicorn workers through a lock file, reusing a result written in the last
+# SINGLE_FLIGHT_SHARE_TTL seconds by another worker.
+SINGLE_FLIGHT_DIR = os.getenv('SINGLE_FLIGHT_DIR')
+SINGLE_FLIGHT_SHARE_TTL = float(os.getenv('SINGLE_FLIGHT_SHARE_TTL', '10'))
+
+single_flight = SingleFlight()
+file_flight = FileFlight(SINGLE_FLIGHT_DIR, SINGLE_FLIGHT_SHARE_TTL) if SINGLE_FLIGHT_DIR else None
+
+# OpenWeatherMap 'group' endpoint: current weather for up to 20 city IDs in one call. IDs are
+# learned from every 'weather' response. They never change, so the TTL is long, but the map is an
+# LRU of CITY_ID_CACHE_SIZE names: every city anyone asks for would otherwise stay in it forever.
+GROUP_MAX_IDS = 20
+CITY_ID_CACHE_SIZE = int(os.getenv('CITY_ID_CACHE_SIZE', '10000'))
+CITY_ID_CACHE_TTL = float(os.getenv('CITY_ID_CACHE_TTL', '86400'))
+city_ids = TTLCache(CITY_ID_CACHE_SIZE, CITY_ID_CACHE_TTL)
+
+# Threads are only started on the first submit, so this is safe to create before gunicorn forks.
+_executor = ThreadPoolExecutor(max_workers=UPSTREAM_WORKERS, thread_name_prefix='upstream')
+
+
+_session = None
+_session_pid = None
+
+
+def create_session(pool_size=UPSTREAM_POOL_SIZE, retries=UPSTREAM_RETRIES, backoff=UPSTREAM_BACKOFF):
+    # Connection failures and 5xx responses are retried with exponential backoff.
+    # Read timeouts are not retried (read=False): a hung upstream should fail fast with a 504
+    # instead of holding the worker for several more read timeouts. Retry-After is ignored: urllib3
+    # would sleep for whatever the upstream asks, uncapped, inside a request thread, so the wait
+    # stays within the backoff schedule (as in async_upstream.fetch_json).
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=False,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+        respect_retry_after_header=False
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session():
+    global _session, _session_pid
+    # Pooled sockets must not be shared between processes, so a forked worker builds its own session
+    if _session is None or _session_pid != os.getpid():
+        _session = create_session()
+        _session_pid = os.getpid()
+    return _session
+
+
+# Stage names for the /metrics timings of each OpenWeatherMap endpoint
+UPSTREAM_STAGES = {'weather': 'upstream_current', 'forecast': 'upstream_forecast', 'group': 'upstream_group'}
+
+
+def upstream_error_reason(error):
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return str(error.response.status_code)
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return 'connection'
+    if isinstance(error, requests.exceptions.Timeout):
+        return 'timeout'
+    return 'other'
+
+
+def record_upstream_call(endpoint, started, error=None):
+    metrics.observe_stage(UPSTREAM_STAGES.get(endpoint, endpoint), time.perf_counter() - started)
+    if error is not None:
+        metrics.inc(metrics.UPSTREAM_ERRORS, endpoint=endpoint, reason=upstream_error_reason(error))
+
+
+def fetch_json(endpoint, params):
+    started = time.perf_counter()
+    try:
+        response = get_session().get(
+            f"{BASE_URL}{endpoint}",
+            params=params,
+            timeout=(UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT)
+        )
+        response.raise_for_status()
+        data = response.json()
+    except requests.exceptions.RequestException as e:
+        record_upstream_call(endpoint, started, e)
+        raise
+    record_upstream_call(endpoint, started)
+    return data
+
+
+def _fetch_both(params):
+    if not CONCURRENT_FETCH:
+        return fetch_json('weather', params), fetch_json('forecast', params)
+
+    current_future = _executor.submit(fetch_json, 'weather', params)
+    forecast_future = _executor.submit(fetch_json, 'forecast', params)
+    try:
+        current_data = current_future.result()
+    except Exception:
+        # Same behaviour as the sequential path: a failed 'weather' call means no forecast is needed.
+        forecast_future.cancel()
+        raise
+    return current_data, forecast_future.result()
+
+
+def payload_etag(data):
+    # Content fingerprint of an upstream payload, the same in every worker that fetched the same data
+    encoded = json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+
+def store_forecast(key, forecast_data):
+    forecast_cache.set(key, forecast_data, payload_etag(forecast_data))
+
+
+def store_current(key, current_data):
+    current_weather_cache.set(key, current_data, payload_etag(current_data))
+    if isinstance(current_data, dict) and current_data.get('id'):
+        city_ids.set(key, current_data['id'])
+
+
+def _fetch_missing(key, params):
+    # Runs for at most one caller per city at a time. The cache is checked again because a
+    # previous leader may have filled it after this caller's first lookup.
+    current_entry = current_weather_cache.peek(key)
+    forecast_entry = forecast_cache.peek(key)
+    current_data = current_entry.value if current_entry else None
+    forecast_data = forecast_entry.value if forecast_entry else None
+    fetched_current = current_data is None
+
+    if current_data is None and forecast_data is None:
+        current_data, forecast_data = _fetch_both(params)
+        store_current(key, current_data)
+        store_forecast(key, forecast_data)
+    elif current_data is None:
+        current_data = fetch_json('weather', params)
+        store_current(key, current_data)
+    elif forecast_data is None:
+        forecast_data = fetch_json('forecast', params)
+        store_forecast(key, forecast_data)
+
+    return [current_data, forecast_data, fetched_current]
+
+
+def _fetch_coalesced(key, params):
+    if file_flight is None:
+        return _fetch_missing(key, params)
+    result, shared = file_flight.do(key, lambda: _fetch_missing(key, params))
+    if shared:
+        # Another worker fetched it: keep a local copy, and that worker already stored the observation
+        current_data, forecast_data, _ = result
+        store_current(key, current_data)
+        store_forecast(key, forecast_data)
+        result = [current_data, forecast_data, False]
+    return result
+
+
+def fetch_current_and_forecast(params):
+    # Returns (current_data, forecast_data, fresh). `fresh` is True only for the one caller whose
+    # request actually fetched current weather from upstream, so only that caller stores an
+    # observation; cache hits and callers that shared an in-flight fetch don't write duplicates.
+    key = normalize_city(params["q"])
+    current_data = current_weather_cache.get(key)
+    forecast_data = forecast_cache.get(key)
+    if current_data is not None and forecast_data is not None:
+        return current_data, forecast_data, False
+
+    (current_data, forecast_data, fetched_current), shared = single_flight.do(
+        key, lambda: _fetch_coalesced(key, params)
+    )
+    return current_data, forecast_data, fetched_current and not shared
+
+
+def weather_validators(city, current_data, forecast_data):
+    # HTTP validators for a /weather response built from these two payloads:
+    # (etag, last_modified, max_age). The payload fingerprints are computed once when they are
+    # cached; max_age is the time until the first of the two cache entries expires. Payloads that
+    # are not (or no longer) the cached ones, e.g. with caching disabled, are hashed here and get
+    # max_age 0.
+    key = normalize_city(city)
+    now = time.time()
+    etags = []
+    last_modified = 0.0
+    expires_at = float('inf')
+    for cache, data in ((current_weather_cache, current_data), (forecast_cache, forecast_data)):
+        entry = cache.peek(key)
+        if entry is not None and entry.value is data and entry.etag:
+            etags.append(entry.etag)
+            last_modified = max(last_modified, entry.stored_at)
+            expires_at = min(expires_at, entry.expires_at)
+        else:
+            etags.append(payload_etag(data))
+            last_modified = expires_at = now
+    etag = hashlib.blake2b('/'.join(etags).encode('ascii'), digest_size=8).hexdigest()
+    return etag, last_modified, max(0, int(expires_at - now))
+
+
+def _fetch_group(ids, params):
+    group_params = {name: value for name, value in params.items() if name != 'q'}
+    # Different names can resolve to the same city, so each ID is requested once
+    group_params['id'] = ','.join(str(city_id) for city_id in dict.fromkeys(ids))
+    data = fetch_json('group', group_params)
+    return {item.get('id'): item for item in data.get('list', [])}
+
+
+def fetch_current_many(cities, params):
+    # Current weather for many cities with as few upstream round trips as possible. Returns a dict
+    # of normalized city -> (current_data, fresh) or the exception raised for that city.
+    #   1. cache hits are answered directly
+    #   2. cities with a known ID are fetched with 'group' calls (20 IDs each), all at once
+    #   3. the rest, plus anything a group call didn't return, get one 'weather' call each, all at once
+    names = {}
+    for city in cities:
+        names.setdefault(normalize_city(city), city.strip())
+
+    results = {}
+    for key in names:
+        current_data = current_weather_cache.get(key)
+        if current_data is not None:
+            results[key] = (current_data, False)
+
+    missing = [key for key in names if key not in results]
+    # Looked up once: an ID could be evicted between two lookups
+    ids = {key: city_ids.get(key) for key in missing}
+    grouped = [key for key in missing if ids[key] is not None]
+    individual = [key for key in missing if ids[key] is None]
+
+    group_futures = []
+    for start in range(0, len(grouped), GROUP_MAX_IDS):
+        chunk = grouped[start:start + GROUP_MAX_IDS]
+        group_futures.append((chunk, _executor.submit(_fetch_group, [ids[key] for key in chunk], params)))
+    for chunk, future in group_futures:
+        try:
+            items = future.result()
+        except requests.exceptions.RequestException:
+            # Group lookups are an optimisation; fall back to one call per city
+            individual.extend(chunk)
+            continue
+        for key in chunk:
+            current_data = items.get(ids[key])
+            if current_data is None:
+                individual.append(key)
+            else:
+                store_current(key, current_data)
+                results[key] = (current_data, True)
+
+    individual_futures = [
+        (key, _executor.submit(fetch_json, 'weather', dict(params, q=names[key])))
+        for key in individual
+    ]
+    for key, future in individual_futures:
+        try:
+            current_data = future.result()
+        except requests.exceptions.RequestException as e:
+            results[key] = e
+            continue
+        store_current(key, current_data)
+        results[key] = (current_data, True)
+
+    return results
+
+
+def current_weather_info(current_data):
+    # The fields of an OpenWeatherMap 'weather' response that /weather returns and current_weather stores
+    return {
+        "city": current_data["name"],
+        "country": current_data["sys"]["country"],
+        "temperature": current_data["main"]["temp"],
+        "feels_like": current_data["main"]["feels_like"],
+        "humidity": current_data["main"]["humidity"],
+        "description": current_data["weather"][0]["description"],
+        "icon": current_data["weather"][0]["icon"],
+        "wind_speed": current_data["wind"]["speed"],
+        "pressure": current_data["main"]["pressure"]
+    }
+
+
+def collect_metrics():
+    for name, cache in (('current_weather', current_weather_cache), ('forecast', forecast_cache)):
+        stats = cache.stats()
+        labels = {"cache": name}
+        yield 'counter', 'weather_cache_hits_total', labels, stats["hits"]
+        yield 'counter', 'weather_cache_misses_total', labels, stats["misses"]
+        yield 'counter', 'weather_cache_evictions_total', labels, stats["evictions"]
+        yield 'gauge', 'weather_cache_entries', labels, stats["size"]
+    yield 'counter', 'weather_single_flight_shared_total', {}, single_flight.shared
+
+
+metrics.register_collector(collect_metrics)
+
+
+def cache_stats():
+    return {
+        "current_weather": current_weather_cache.stats(),
+        "forecast": forecast_cache.stats(),
+        "city_ids": city_ids.stats(),
+        "single_flight": single_flight.stats()
+    }